@@ -1,88 +1,142 @@
 from typing import Any, List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders.unstructured import UnstructuredBaseLoader
-from langchain.callbacks import get_openai_callback
-from langchain.chains.summarize import load_summarize_chain
-from langchain.chat_models import ChatOpenAI
 from configparser import ConfigParser
+import functools
 import os
 import mongodb as mongodb
+import section_titles as section_titles
+import summary_cache as summary_cache
+import llm_models as llm_models
+import section_packing as section_packing
+import incremental_summary as incremental_summary
+import llm_backend as llm_backend
 import time
 import re
 from mongodb import company_from_cik
 
-parser = ConfigParser()
-_ = parser.read(os.path.join("credentials.cfg"))
+# sections shorter than this are not summarized
+MIN_SECTION_LENGTH = 250
 
-class UnstructuredStringLoader(UnstructuredBaseLoader):
+# langchain is imported when the models are first called (see llm_backend) and credentials.cfg is read on first use,
+# so importing this module (restructure_document, the summary cache, ...) stays fast, see benchmarks/import_time.py
+
+@functools.lru_cache(maxsize=None)
+def get_config():
+    """
+    :return: ConfigParser with the content of credentials.cfg, read on the first call
+    """
+    parser = ConfigParser()
+    _ = parser.read(os.path.join("credentials.cfg"))
+    return parser
+
+def get_openai_api_key():
+    return get_config().get("open_ai", "api_key")
+
+@functools.lru_cache(maxsize=None)
+def unstructured_string_loader_class():
     """
-    Uses unstructured to load a string
-    Source of the string, for metadata purposes, can be passed in by the caller
+    :return: the UnstructuredStringLoader class, defined on the first call because it extends a langchain class
     """
+    from langchain.document_loaders.unstructured import UnstructuredBaseLoader
+
+    class UnstructuredStringLoader(UnstructuredBaseLoader):
+        """
+        Uses unstructured to load a string
+        Source of the string, for metadata purposes, can be passed in by the caller
+        """
 
-    def __init__(
-        self, content: str, source: str = None, mode: str = "single",
-        **unstructured_kwargs: Any
-    ):
-        self.content = content
-        self.source = source
-        super().__init__(mode=mode, **unstructured_kwargs)
+        def __init__(
+            self, content: str, source: str = None, mode: str = "single",
+            **unstructured_kwargs: Any
+        ):
+            self.content = content
+            self.source = source
+            super().__init__(mode=mode, **unstructured_kwargs)
 
-    def _get_elements(self) -> List:
-        from unstructured.partition.text import partition_text
+        def _get_elements(self) -> List:
+            from unstructured.partition.text import partition_text
 
-        return partition_text(text=self.content, **self.unstructured_kwargs)
+            return partition_text(text=self.content, **self.unstructured_kwargs)
+
+        def _get_metadata(self) -> dict:
+            return {"source": self.source} if self.source else {}
+
+    return UnstructuredStringLoader
+
+def __getattr__(name):
+    # analyzer.parser and analyzer.UnstructuredStringLoader are built on first use
+    if name == "parser":
+        return get_config()
+    if name == "UnstructuredStringLoader":
+        return unstructured_string_loader_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def text_documents(text, source=None):
+    """
+    Wrap a string in a langchain document, without partitioning it with unstructured like UnstructuredStringLoader:
+    the text is split in chunks by split_doc_in_chunks anyway.
+    :param text: a string
+    :param source: source of the string, for metadata purposes
+    :return: list with one langchain document
+    """
+    from langchain_core.documents import Document
 
-    def _get_metadata(self) -> dict:
-        return {"source": self.source} if self.source else {}
+    return [Document(page_content=text, metadata={"source": source} if source else {})]
 
 
-def split_doc_in_chunks(doc, chunk_size=20000):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=100)
-    chunks = text_splitter.split_documents(doc)
+def split_doc_in_chunks(doc, chunk_size=20000, model=None):
+    """
+    :param doc: langchain documents
+    :param chunk_size: size of a chunk in characters, used when model is None
+    :param model: split in chunks of llm_models.chunk_size(model) tokens of the model
+    :return: list of langchain documents
+    """
+    chunks = text_splitter(chunk_size, model).split_documents(doc)
     return chunks
 
-def compute_cost(tokens, model="gpt-3.5-turbo"):
+@functools.lru_cache(maxsize=None)
+def text_splitter(chunk_size, model):
+    """
+    :return: the text splitter of split_doc_in_chunks, created once per chunk_size / model
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    if model is None:
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=100)
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=llm_models.get_encoding(model).name, chunk_size=llm_models.chunk_size(model),
+        chunk_overlap=llm_models.CHUNK_OVERLAP_TOKENS, disallowed_special=())
+
+def compute_cost(prompt_tokens, model="gpt-3.5-turbo", completion_tokens=0):
     """
-    Compute API cost from number of tokens
-    :param tokens: the number of token
+    Compute API cost from number of tokens, see llm_models.MODELS
+    :param prompt_tokens: the number of tokens sent to the model
     :param model: the model name
+    :param completion_tokens: the number of tokens of the answers
     :return: cost in USD
     """
-    if model == "gpt-3.5-turbo":
-        return round(tokens / 1000 * 0.002, 4)
-    if model == "gpt-3.5-turbo-16k":
-        return round(tokens / 1000 * 0.004, 4)
-    
+    return llm_models.compute_cost(prompt_tokens, model, completion_tokens)
+
 def create_summary(section_text, model, chain_type="map_reduce", verbose=False):
     """
-    Call OpenAI model with langchain library using ChatOpenAI.
-    then call langchain.load_summarize_chain with the selected model and the chain_type
+    Summarize a text with the summarize chain of the model and chain_type of llm_backend.get_llm_backend()
+    (by default langchain ChatOpenAI and load_summarize_chain, reused between calls).
     :param section_text: text to be summarized
     :param model: language model
     :param chain_type: chain type for langchain.load_summarize_chain
     :param verbose: print langchain process
-    :return: the model response, and the number of total tokens it took.
+    :return: the model response, the number of total tokens it took and its cost.
     """
-    # load langchain language model
-    llm = ChatOpenAI(model_name=model, openai_api_key=parser.get("open_ai", "api_key"))
-
-    # prepare section_text string with a custom string loader to be ready for load_summarize_chain
-    string_loader = UnstructuredStringLoader(section_text)
-
-    # split the string in multiple chunks
-    docs = split_doc_in_chunks(string_loader.load())
+    return llm_backend.get_llm_backend().summarize(section_text, model, chain_type, verbose)
 
-    # call model with the chain_type specified
-    chain = load_summarize_chain(llm, chain_type=chain_type, verbose=verbose)
-
-    # retrieve model response
-    with get_openai_callback() as cb:
-        res = chain.run(docs)
-
-    return res, cb.total_tokens
+def summary_bullets(summary):
+    """
+    Split a summary in bullet points using "." as separator
+    :param summary: text returned by the model
+    :return: array of strings
+    """
+    return [x.strip() for x in re.split(r'(?<!inc)(?<!Inc)\. ', summary)]
 
-def summarize_section(section_text, model="gpt-3.5-turbo", chain_type="map_reduce", verbose=False):
+def summarize_section(section_text, model="gpt-3.5-turbo", chain_type="map_reduce", verbose=False, cache=None):
     """
     Create a summary for a document section.
     Output is a json {"data":["info1", "info2", ..., "infoN"]}
@@ -91,18 +145,173 @@ def summarize_section(section_text, model="gpt-3.5-turbo", chain_type="map_reduc
     :param chain_type: the type of chain to use for summarization, default is "map_reduce",
      possible other values are "stuff" and "refine"
     :param verbose: passed to langchain to print details about the chain process
-    :return: bullet points of the summary as an array of strings and the cost of the request
+    :param cache: summary_cache.SummaryCache, the model is called only if the summary is not in the cache
+    :return: bullet points of the summary as an array of strings and the cost of the request (0 if cached)
+    """
+    def summarize():
+        # call model to create the summary
+        summary, tokens, cost = create_summary(section_text, model, chain_type, verbose)
+        return summary_bullets(summary), tokens, cost
+
+    if cache is None:
+        bullets, _, cost = summarize()
+        return bullets, cost
+    return cache.get_or_create(section_text, model, chain_type, summarize)
+
+def create_completion(prompt, model, verbose=False):
+    """
+    Send a single prompt to the model, without a summarize chain.
+    :param prompt: the prompt
+    :param model: language model
+    :param verbose: print langchain process
+    :return: the model response, the number of total tokens it took and its cost.
     """
-    # call model to create the summary
-    summary, tokens = create_summary(section_text, model, chain_type, verbose)
+    return llm_backend.get_llm_backend().complete(prompt, model, verbose)
 
-    # split summary in bullet points using "." as separator
-    bullets = [x.strip() for x in re.split(r'(?<!inc)(?<!Inc)\. ', summary)]
+def create_packed_summary(pack, model, verbose=False):
+    """
+    Summarize several short sections with a single call of the model, see section_packing.
+    :param pack: list of tuples (key, title, text, tokens)
+    :param model: language model
+    :param verbose: print langchain process
+    :return: a dictionary section key -> summary (sections missing from the answer are not in it),
+     the number of total tokens it took and its cost.
+    """
+    response, tokens, cost = create_completion(section_packing.build_packed_prompt(pack), model, verbose)
+    return section_packing.parse_packed_response(response, pack), tokens, cost
 
-    # compute cost based on tokens of the response and the used model
-    cost = compute_cost(tokens, model=model)
+def summarize_packed_sections(sections, verbose=False, cache=None, models=llm_models.SUMMARY_MODELS):
+    """
+    Summarize short sections, packing as many of them as possible in each call of the model.
+    A section alone in its pack, or missing from the answer of the model, is summarized with summarize_section.
+    :param sections: list of tuples (key, title, text), keys are unique
+    :param verbose: passed to langchain to print details about the chain process
+    :param cache: summary_cache.SummaryCache
+    :param models: models to choose from
+    :return: dictionary key -> bullet points of the summary, and the cost of the requests
+    """
+    result = {}
+    total_cost = 0
+
+    to_pack = []
+    for key, title, text in sections:
+        # packed summary, or summary of the section alone
+        settings = [(model, section_packing.PACKED_CHAIN_TYPE) for model in models]
+        settings.append(select_summary_model(title, text, models))
+        entry = cache.get_any(text, settings) if cache is not None else None
+        if entry is not None:
+            result[key] = entry["bullets"]
+        else:
+            to_pack.append((key, title, text, llm_models.count_tokens(text, models[0])))
+    if not to_pack:
+        return result, total_cost
+
+    model, packs = section_packing.plan_packs(to_pack, models)
+    alone = []
+    for pack in packs:
+        if len(pack) == 1:
+            alone += pack
+            continue
+
+        start_time = time.time()
+        summaries, tokens, cost = create_packed_summary(pack, model, verbose)
+        total_cost += cost
+        print(f"packed {len(pack)} sections: {', '.join(s[1] for s in pack)} cost: {cost}$ "
+              f"duration:{round(time.time() - start_time, 1)}s used {model}")
+
+        pack_tokens = sum(s[3] for s in pack)
+        for section in pack:
+            key, title, text, section_tokens = section
+            if key not in summaries:
+                print(f"{title} missing from the packed answer")
+                alone.append(section)
+                continue
+            result[key] = summary_bullets(summaries[key])
+            if cache is not None:
+                # the tokens and the cost of the call are shared by the sections
+                share = section_tokens / pack_tokens
+                cache.put(text, model, section_packing.PACKED_CHAIN_TYPE, result[key],
+                          round(tokens * share), round(cost * share, 6))
+
+    for key, title, text, _ in alone:
+        section_model, chain_type = select_summary_model(title, text, models)
+        result[key], cost = summarize_section(text, section_model, chain_type, verbose, cache)
+        total_cost += cost
 
-    return bullets, cost
+    return result, total_cost
+
+def previous_filing_sections(doc):
+    """
+    :param doc: a parsed_document from MongoDB
+    :return: a tuple (sections of the previous filing of the same company and form type, see restructure_document,
+     its "items_summary" document), None if there is no previous filing or it was not summarized
+    """
+    previous = mongodb.get_previous_document("parsed_documents", doc)
+    if previous is None:
+        return None
+    previous_summary = mongodb.get_collection("items_summary").find_one({"_id": previous["_id"]})
+    previous_sections = restructure_document(previous)
+    if previous_summary is None or previous_sections is None:
+        return None
+    return previous_sections, previous_summary
+
+def incremental_section_summary(section_title, section_text, previous, verbose=False, cache=None,
+                                models=llm_models.SUMMARY_MODELS, boilerplate=None):
+    """
+    Update the summary of the same section of the previous filing, sending to the model only the paragraphs
+    added, changed and removed since then (see incremental_summary).
+    :param section_title: title returned by restructure_document
+    :param section_text: text of the section
+    :param previous: result of previous_filing_sections
+    :param verbose: passed to langchain verbose
+    :param cache: summary_cache.SummaryCache
+    :param models: models to choose from, the first one with a context large enough is used
+    :param boilerplate: boilerplate.BoilerplateIndex the boilerplate of section_text was removed with, it is removed
+     from the previous section too so that it is not seen as removed this year
+    :return: a tuple (bullet points of the summary, bullet points of the changes, cost), None if the section
+     has to be summarized from scratch. The bullet points are None if the model answer was not valid.
+    """
+    previous_sections, previous_summary = previous
+    previous_section = previous_summary.get(section_title)
+    if section_title not in previous_sections or not isinstance(previous_section, dict) \
+            or not previous_section.get("summary"):
+        return None
+
+    previous_text = previous_sections[section_title]["text"]
+    if boilerplate is not None:
+        previous_text, _ = boilerplate.strip_boilerplate(previous_text)
+    diff = incremental_summary.align_paragraphs(incremental_summary.split_paragraphs(previous_text),
+                                                incremental_summary.split_paragraphs(section_text))
+    if incremental_summary.changed_share(diff, models[0]) > incremental_summary.MAX_CHANGED_SHARE:
+        return None
+    print(f"{section_title} paragraphs unchanged: {len(diff['unchanged'])} changed: {len(diff['changed'])} "
+          f"added: {len(diff['added'])} removed: {len(diff['removed'])}")
+
+    prompt = incremental_summary.build_incremental_prompt(previous_section["summary"], diff)
+    if prompt is None:
+        # nothing changed since the previous filing
+        return previous_section["summary"], [], 0
+
+    tokens = llm_models.count_tokens(prompt, models[0]) + llm_models.ANSWER_TOKENS
+    model = next((m for m in models if llm_models.MODELS[m]["context"] >= tokens), None)
+    if model is None:
+        return None
+
+    chain_type = incremental_summary.INCREMENTAL_CHAIN_TYPE
+    entry = cache.get(prompt, model, chain_type) if cache is not None else None
+    if entry is not None:
+        return entry["bullets"]["summary"], entry["bullets"]["changes"], 0
+
+    response, tokens, cost = create_completion(prompt, model, verbose)
+    answer = incremental_summary.parse_incremental_response(response)
+    if answer is None:
+        print(f"{section_title} invalid incremental summary, summarized from scratch")
+        return None, None, cost
+
+    bullets = {"summary": summary_bullets(answer[0]), "changes": summary_bullets(answer[1]) if answer[1] else []}
+    if cache is not None:
+        cache.put(prompt, model, chain_type, bullets, tokens, cost)
+    return bullets["summary"], bullets["changes"], cost
 
 def restructure_parsed_10k(doc):
     """
@@ -129,30 +338,8 @@ def restructure_parsed_10k(doc):
 
     for s in doc["sections"]:
 
-        found = None
-        if ("business" in s.lower() or "overview" in s.lower() or "company" in s.lower() or "general" in s.lower() or "outlook" in s.lower())\
-                and not "combination" in s.lower():
-            found = "business"
-        elif "propert" in s.lower() and not "plant" in s.lower() and not "business" in s.lower():
-            found = "property"
-        elif "foreign" in s.lower() and "jurisdiction" in s.lower():
-            found = "foreign"
-        elif "legal" in s.lower() and "proceeding" in s.lower():
-            found = "legal"
-        elif "information" in s.lower() and "other" in s.lower():
-            found = "other"
-        elif "unresolved" in s.lower():
-            found = "unresolved"
-        elif "risk" in s.lower():
-            found = "risk"
-        
-        # we are not going to summarize MD&A and financial notes sections of the document, while both extremely important,
-        # because we didn't manage to obtain useful results from OpenAI models, without further pre-processing.
-        
-        # elif "management" in s.lower() and "discussion" in s.lower():
-        #     found = "MD&A"
-        # elif "supplementa" in s.lower() or ("note" in s.lower() and "statement" not in s.lower()):
-        #     found = "notes"
+        # see section_titles.SECTION_TITLE_RULES
+        found = section_titles.classify_section_title("10-K", s)
 
         if found is not None:
             result[found]["text"] += doc["sections"][s]["text"]
@@ -175,19 +362,8 @@ def restructure_parsed_10q(doc):
 
     for s in doc["sections"]:
 
-        found = None
-        if "legal" in s.lower() and "proceeding" in s.lower():
-            found = "legal"
-        elif "management" in s.lower() and "discussion" in s.lower():
-            found = "MD&A"
-        elif "information" in s.lower() and "other" in s.lower():
-            found = "other"
-        elif "risk" in s.lower():
-            found = "risk"
-        elif "sales" in s.lower() and "equity" in s.lower():
-            found = "equity"
-        elif "default" in s.lower():
-            found = "defaults"
+        # see section_titles.SECTION_TITLE_RULES
+        found = section_titles.classify_section_title("10-Q", s)
 
         if found is not None:
             result[found]["text"] += doc["sections"][s]["text"]
@@ -203,96 +379,183 @@ def restructure_parsed_8k(doc):
     result = {}
 
     for s in doc["sections"]:
-        if "financial statements and exhibits" in s.lower():
+        if section_titles.classify_section_title("8-K", s) == "exhibits":
             continue
         result[s] = doc["sections"][s]
 
     return result
 
-def sections_summary(doc, verbose=False):
+def restructure_document(doc):
+    """
+    :param doc: a parsed_document from MongoDB
+    :return: the sections to summarize, see restructure_parsed_10k/10q/8k, None if the form type is not supported
+     or if doc was skipped or failed by batch_parse and never parsed (see batch_parse.parse_status)
+    """
+    if "sections" not in doc:
+        print(f"{doc['_id']} was not parsed: {doc.get('status')}")
+        return None
+    if "10-K" in doc["form_type"]:
+        return restructure_parsed_10k(doc)
+    elif "10-Q" in doc["form_type"]:
+        return restructure_parsed_10q(doc)
+    elif doc["form_type"] == "8-K":
+        return restructure_parsed_8k(doc)
+    print(f"form_type {doc['form_type']} is not yet implemented")
+    return None
+
+def select_summary_model(section_title, section_text, models=llm_models.SUMMARY_MODELS):
+    """
+    Select chain_type and model with the fewest calls for the number of tokens of the section, see llm_models.plan_summary
+    :param section_title: title returned by restructure_document
+    :param section_text: text of the section
+    :param models: models to choose from
+    :return: a tuple (model, chain_type)
+    """
+    return llm_models.plan_summary(section_title, llm_models.count_tokens(section_text, models[0]), models)
+
+def summary_document_header(doc):
+    """
+    :param doc: a parsed_document from MongoDB
+    :return: the "items_summary" document of doc, without the sections summaries
+    """
+    company = company_from_cik(doc["cik"])
+    return {"_id": doc["_id"],
+            "name": company["name"],
+            "ticker": company["ticker"],
+            "form_type": doc["form_type"],
+            "filing_date": doc["filing_date"]}
+
+def sections_summary(doc, verbose=False, cache=None, pack=True, incremental=True, boilerplate=None, store=True):
     """
     Summarize all sections of a document using openAI API.
     Upsert summary on MongoDB (overwrite previous one, in case we make changes to openai_interface)
 
     This method is configured to use gpt-3.5-turbo. At the moment this model has two different version,
-    a version with 4k token and a version with 16k tokens. The one we use is based on the length of a section.
+    a version with 4k token and a version with 16k tokens. The one we use is the one summarizing the section
+    with the fewest calls, based on its number of tokens (see select_summary_model).
 
     :param doc: a parsed_document from MongoDB
     :param verbose: passed to langchain verbose
-    :return:
+    :param cache: summary_cache.SummaryCache, default the MongoDB cache of summary_cache.get_summary_cache(),
+     False to always call the model
+    :param pack: summarize the short sections together, see summarize_packed_sections
+    :param incremental: update the summaries of the previous 10-K/10-Q, see incremental_section_summary
+    :param boilerplate: boilerplate.BoilerplateIndex, boilerplate paragraphs are removed before summarizing
+    :param store: see documents_summary
+    :return: the summary document, None if the form type is not supported, and the cost
     """
+    results, total_cost = documents_summary([doc], verbose, cache, pack, incremental, boilerplate, store)
+    return results.get(doc["_id"]), total_cost
 
-    company = company_from_cik(doc["cik"])
-    result = {"_id": doc["_id"],
-              "name": company["name"],
-              "ticker": company["ticker"],
-              "form_type": doc["form_type"],
-              "filing_date": doc["filing_date"]}
+def documents_summary(docs, verbose=False, cache=None, pack=True, incremental=True, boilerplate=None, store=True):
+    """
+    Summarize all sections of several documents, like sections_summary.
+    With pack, the short sections of all the documents (e.g. the 8-K of a company) are summarized together,
+    several in each call.
+    :param docs: parsed_documents from MongoDB
+    :param verbose: passed to langchain verbose
+    :param cache: see sections_summary
+    :param pack: summarize the short sections together, see summarize_packed_sections
+    :param incremental: long sections of a 10-K or 10-Q are summarized updating the summary of the previous
+     filing of the company with what changed, see incremental_section_summary
+    :param boilerplate: boilerplate.BoilerplateIndex, the paragraphs shared by many companies are removed from
+     the sections before summarizing them
+    :param store: read the company from MongoDB and upsert the summaries in "items_summary";
+     with store=False, cache=False and incremental=False MongoDB is not used at all (offline runs with
+     llm_backend.FakeBackend)
+    :return: dictionary _id -> summary document, and the total cost
+    """
+    if cache is None:
+        cache = summary_cache.get_summary_cache()
+    elif cache is False:
+        cache = None
 
     # keep track of duration and costs
     total_cost = 0
     total_start_time = time.time()
 
-    if "10-K" in doc["form_type"]:
-        new_doc = restructure_parsed_10k(doc)
-    elif "10-Q" in doc["form_type"]:
-        new_doc = restructure_parsed_10q(doc)
-    elif doc["form_type"] == "8-K":
-        new_doc = restructure_parsed_8k(doc)
-    else:
-        print(f"form_type {doc['form_type']} is not yet implemented")
-        return
+    results = {}
+    packed = []
+    for doc in docs:
+        new_doc = restructure_document(doc)
+        if new_doc is None:
+            continue
+        if store:
+            result = summary_document_header(doc)
+        else:
+            result = {"_id": doc["_id"], "form_type": doc["form_type"], "filing_date": doc.get("filing_date")}
+        results[doc["_id"]] = result
+        previous = previous_filing_sections(doc) if incremental and doc["form_type"] != "8-K" else None
 
-    # for each section
-    for section_title, section in new_doc.items():
+        # for each section
+        for section_title, section in new_doc.items():
 
-        section_links = section["links"] if "links" in section else None
-        section_text = section["text"]
+            section_links = section["links"] if "links" in section else None
+            section_text = section["text"]
 
-        start_time = time.time()
-        
-        # if the section text is too small we skip it, it's probably not material
-        if len(section_text) < 250:
-            continue
+            start_time = time.time()
 
-        # select chain_type and model (4k or 16k) based on the section and its length
-        if section_title in ["business", "risk", "MD&A"]:
-            chain_type = "refine"
+            if boilerplate is not None:
+                section_text, removed = boilerplate.strip_boilerplate(section_text)
+                if removed:
+                    print(f"{section_title} {len(removed)} boilerplate paragraphs removed")
 
-            if len(section_text) > 25000:
-                model = "gpt-3.5-turbo-16k"
-            else:
-                model = "gpt-3.5-turbo"
-        else:
-            if len(section_text) < 25000:
-                chain_type = "refine"
-                model = "gpt-3.5-turbo"
-            elif len(section_text) < 50000:
-                chain_type = "map_reduce"
-                model = "gpt-3.5-turbo"
-            else:
-                chain_type = "map_reduce"
-                model = "gpt-3.5-turbo-16k"
+            # if the section text is too small we skip it, it's probably not material
+            if len(section_text) < MIN_SECTION_LENGTH:
+                continue
 
-        original_len = len(section_text)
+            # short sections are summarized at the end, together
+            if pack and llm_models.count_tokens(section_text) <= section_packing.PACK_MAX_SECTION_TOKENS:
+                result[section_title] = {"summary": None, "links": section_links}
+                packed.append(((doc["_id"], section_title), section_title, section_text))
+                continue
 
-        # get summary from openAI model
-        print(f"{section_title} original_len: {original_len} use {model} w/ chain {chain_type}")
-        summary, cost = summarize_section(section_text, model, chain_type, verbose)
+            if previous is not None:
+                updated = incremental_section_summary(section_title, section_text, previous, verbose, cache,
+                                                      boilerplate=boilerplate)
+                if updated is not None:
+                    summary, changes, cost = updated
+                    total_cost += cost
+                    if summary is not None:
+                        result[section_title] = {"summary": summary, "changes": changes, "links": section_links,
+                                                 "previous": previous[1]["_id"]}
+                        print(f"{section_title} updated from the previous filing, cost: {cost}$ "
+                              f"duration:{round(time.time() - start_time, 1)}s")
+                        continue
 
-        result[section_title] = {"summary":summary, "links": section_links}
+            model, chain_type = select_summary_model(section_title, section_text)
 
-        summary_len = len(''.join(summary))
-        reduction = 100 - round(summary_len / original_len * 100, 2)
+            original_len = len(section_text)
 
-        total_cost += cost
-        duration = round(time.time() - start_time, 1)
+            # get summary from openAI model
+            print(f"{section_title} original_len: {original_len} use {model} w/ chain {chain_type}")
+            summary, cost = summarize_section(section_text, model, chain_type, verbose, cache)
+
+            result[section_title] = {"summary":summary, "links": section_links}
 
-        print(f"{section_title} original_len: {original_len} summary_len: {summary_len} reduction: {reduction}% "
-              f"cost: {cost}$ duration:{duration}s used {model} w/ chain {chain_type}")
+            summary_len = len(''.join(summary))
+            reduction = 100 - round(summary_len / original_len * 100, 2)
 
-    mongodb.upsert_document("items_summary", result)
+            total_cost += cost
+            duration = round(time.time() - start_time, 1)
+
+            print(f"{section_title} original_len: {original_len} summary_len: {summary_len} reduction: {reduction}% "
+                  f"cost: {cost}$ duration:{duration}s used {model} w/ chain {chain_type}")
+
+    if packed:
+        summaries, cost = summarize_packed_sections(packed, verbose, cache)
+        total_cost += cost
+        for (doc_id, section_title), summary in summaries.items():
+            results[doc_id][section_title]["summary"] = summary
+
+    if store:
+        for result in results.values():
+            mongodb.upsert_document("items_summary", result)
 
     total_duration = round(time.time() - total_start_time, 1)
 
-    print(f"\nTotal Cost: {total_cost}$, Total duration: {total_duration}s")
\ No newline at end of file
+    print(f"\nTotal Cost: {total_cost}$, Total duration: {total_duration}s")
+    if cache is not None:
+        print(f"Summary cache: {cache.stats()}")
+
+    return results, total_cost
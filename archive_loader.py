@@ -0,0 +1,174 @@
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
+import pandas as pd
+import mongodb as mongodb
+
+# Nightly bulk archives published by EDGAR (https://www.sec.gov/edgar/sec-api-documentation):
+#   https://www.sec.gov/Archives/edgar/daily-index/bulkdata/submissions.zip
+#   https://www.sec.gov/Archives/edgar/daily-index/xbrl/companyfacts.zip
+# Both contain one json per company (CIK##########.json), submissions.zip also contains
+# the pages of older filings (CIK##########-submissions-001.json).
+MEMBER_NAME = re.compile(r"CIK(\d{10})(?:-submissions-\d+)?\.json$")
+
+
+def universe_ciks(tickers=None, ciks=None):
+    """
+    Build the set of ciks to load.
+    :param tickers: list of tickers, resolved with the cik_ticker map
+    :param ciks: list of ciks
+    :return: a set of 10 digits ciks, or None to load every company in the archive
+    """
+    if tickers is None and ciks is None:
+        return None
+    universe = set(str(c).zfill(10) for c in ciks or [])
+    if tickers:
+        for ticker, company in mongodb.cik_ticker_resolver.resolve_many(tickers).items():
+            if company is None:
+                print(f"ticker {ticker} not found in cik_ticker map")
+            else:
+                universe.add(company["cik"])
+    return universe
+
+
+def group_members(zf, universe):
+    """
+    Group the members of the archive by cik.
+    :param zf: ZipFile
+    :param universe: set of ciks to keep, None to keep all of them
+    :return: dictionary cik -> {"main": member name, "pages": [member names]}
+    """
+    members = {}
+    for name in zf.namelist():
+        m = MEMBER_NAME.search(name)
+        if m is None:
+            continue
+        cik = m.group(1)
+        if universe is not None and cik not in universe:
+            continue
+        entry = members.setdefault(cik, {"main": None, "pages": []})
+        if "-submissions-" in name:
+            entry["pages"].append(name)
+        else:
+            entry["main"] = name
+    return members
+
+
+def _load_archive(zip_path, collection_name, build_document, tickers, ciks, batch_size, workers):
+    universe = universe_ciks(tickers, ciks)
+    writer = mongodb.BulkWriter(collection_name, flush_size=batch_size, flush_interval=60)
+    # bound the documents waiting to be written, a single company facts json can be tens of MB
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    loaded = 0
+    failed = 0
+    futures = set()
+    start_time = time.time()
+
+    def upsert(doc):
+        try:
+            writer.upsert(doc)
+        finally:
+            in_flight.release()
+
+    def check(future):
+        # write errors are counted by the writer per document, only unexpected errors are raised by an upsert
+        nonlocal failed
+        try:
+            future.result()
+        except Exception as e:
+            failed += 1
+            print(f"upsert in {collection_name} failed: {type(e).__name__}: {e}")
+
+    with zipfile.ZipFile(zip_path) as zf, ThreadPoolExecutor(max_workers=workers) as executor:
+        members = group_members(zf, universe)
+        print(f"{len(members)} companies to load from {zip_path}")
+        for cik, entry in members.items():
+            if entry["main"] is None:
+                continue
+            # members are read one at a time directly from the archive, nothing is extracted on disk
+            doc = build_document(zf, cik, entry)
+            in_flight.acquire()
+            futures.add(executor.submit(upsert, doc))
+            loaded += 1
+            # at most workers * 2 futures are pending, the others are checked and dropped
+            for future in [f for f in futures if f.done()]:
+                futures.remove(future)
+                check(future)
+            if loaded % 1000 == 0:
+                print(f"{loaded} companies parsed in {round(time.time() - start_time, 1)}s")
+        for future in as_completed(futures):
+            check(future)
+
+    writer.close()
+    print(f"{loaded} companies loaded in {collection_name} in {round(time.time() - start_time, 1)}s, "
+          f"{writer.written} written, {writer.errors} errors, {failed} failed upserts")
+    return loaded
+
+
+def _submissions_document(zf, cik, entry):
+    fetched = orjson.loads(zf.read(entry["main"]))
+    pages = [orjson.loads(zf.read(name)) for name in sorted(entry["pages"])]
+    doc, _ = mongodb.merge_submissions(cik, None, fetched, pages)
+    return doc
+
+
+def _company_facts_document(zf, cik, entry):
+    doc = orjson.loads(zf.read(entry["main"]))
+    doc["_id"] = cik
+    return doc
+
+
+def load_submissions_archive(zip_path, tickers=None, ciks=None, batch_size=200, workers=4):
+    """
+    Bootstrap the "submissions" collection from a local copy of EDGAR submissions.zip.
+    Each company is merged with its pages of older filings, like sync_cik_submissions does.
+    :param zip_path: path of submissions.zip
+    :param tickers: optional list of tickers to load
+    :param ciks: optional list of ciks to load (if both tickers and ciks are None, every company is loaded)
+    :param batch_size: number of documents in a single bulk_write
+    :param workers: number of parallel bulk_write
+    :return: number of companies loaded
+    """
+    return _load_archive(zip_path, "submissions", _submissions_document, tickers, ciks, batch_size, workers)
+
+
+def load_companyfacts_archive(zip_path, tickers=None, ciks=None, batch_size=20, workers=4):
+    """
+    Bootstrap the "company_facts" collection (XBRL facts, https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json)
+    from a local copy of EDGAR companyfacts.zip.
+    :param zip_path: path of companyfacts.zip
+    :param tickers: optional list of tickers to load
+    :param ciks: optional list of ciks to load (if both tickers and ciks are None, every company is loaded)
+    :param batch_size: number of documents in a single bulk_write
+    :param workers: number of parallel bulk_write
+    :return: number of companies loaded
+    """
+    return _load_archive(zip_path, "company_facts", _company_facts_document, tickers, ciks, batch_size, workers)
+
+
+def get_company_facts_df(cik):
+    """
+    Build the us-gaap USD facts table of a company from the "company_facts" collection,
+    with the same columns of get_company_data in the notebooks.
+    :param cik: company cik
+    :return: DataFrame with columns Concept, Value, Fiscal Year, Fiscal Period, entityName, cik, or None
+    """
+    data = mongodb.get_collection("company_facts").find_one({"_id": str(cik).zfill(10)})
+    if data is None:
+        print(f"company facts not found in mongodb for {cik}")
+        return None
+
+    us_gaap_data = data.get("facts", {}).get("us-gaap", {})
+    table_data = []
+    for concept, values in us_gaap_data.items():
+        for value in values.get("units", {}).get("USD", []):
+            if "val" in value:
+                table_data.append([concept, value.get("val"), value.get("fy"), value.get("fp")])
+
+    df = pd.DataFrame(table_data, columns=["Concept", "Value", "Fiscal Year", "Fiscal Period"])
+    df["entityName"] = data.get("entityName", "Unknown")
+    df["cik"] = cik
+    return df
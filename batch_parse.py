@@ -0,0 +1,157 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import time
+import traceback
+import mongodb as mongodb
+import boilerplate as boilerplate
+
+
+def parse_status(status, error=None):
+    """
+    Fields set on the parsed_documents entry of a document that was skipped or failed, so it is not selected again
+    by select_documents_to_parse until the parser version changes.
+    The sections of a previous parser version are kept, a successful parse replaces the whole entry.
+    A document never parsed gets an entry with no cik, form_type, filing_date nor sections:
+    the queries on parsed documents never return it.
+    :param status: "skipped" or "failed"
+    :param error: error message of a failed document
+    :return: dictionary of the fields to set
+    """
+    return {"status": status, "error": error, "status_parser_version": mongodb.PARSER_VERSION}
+
+
+def select_documents_to_parse(form_types=None, parser_version=None, limit=None, retry_failed=False):
+    """
+    Select the documents that have no parsed_documents entry, or that were parsed with an older parser version.
+    Documents skipped or failed with the current parser version (see parse_status) are not selected.
+    :param form_types: optional list of form types to select
+    :param parser_version: the current parser version, default mongodb.PARSER_VERSION
+    :param limit: optional max number of documents
+    :param retry_failed: also select the documents that failed with the current parser version
+    :return: list of document ids
+    """
+    if parser_version is None:
+        parser_version = mongodb.PARSER_VERSION
+
+    pipeline = []
+    if form_types is not None:
+        pipeline.append({"$match": {"form_type": {"$in": list(form_types)}}})
+    pipeline += [
+        {"$project": {"_id": 1}},
+        # only the parser version of the parsed document is needed, not its sections
+        {"$lookup": {"from": "parsed_documents", "localField": "_id", "foreignField": "_id",
+                     "pipeline": [{"$project": {"_id": 0, "parser_version": 1, "status": 1,
+                                                "status_parser_version": 1}}],
+                     "as": "parsed"}},
+        {"$match": {"$or": [{"parsed": {"$size": 0}},
+                            {"parsed.0.parser_version": {"$not": {"$gte": parser_version}},
+                             "parsed.0.status_parser_version": {"$not": {"$gte": parser_version}}}]
+                    + ([{"parsed.0.status": "failed"}] if retry_failed else [])}},
+        {"$project": {"_id": 1}},
+    ]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+
+    return [d["_id"] for d in mongodb.get_collection("documents").aggregate(pipeline, allowDiskUse=True)]
+
+
+def _init_worker(max_memory_mb):
+    if max_memory_mb is not None:
+        # a document that needs more memory raises MemoryError instead of taking down the node
+        import resource
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _parse_worker(args):
+    """
+    Parse a single document in a worker process.
+    :return: a tuple (document id, status, parsed document or None, error message or None,
+     paragraph signatures for the boilerplate index or None).
+     The status is "parsed", "failed", "skipped", or "unknown_cik" for a document skipped because its cik is not
+     in the cik_ticker map yet
+    """
+    document_id, parser_backend, verbose, index_boilerplate = args
+    try:
+        doc = mongodb.get_collection("documents").find_one({"_id": document_id})
+        if doc is None:
+            return document_id, "failed", None, "document not found", None
+        if verbose:
+            result = mongodb.parse_document_sections(doc, parser_backend)
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = mongodb.parse_document_sections(doc, parser_backend)
+        if result is None:
+            unknown_cik = mongodb.company_from_cik(doc["cik"]) is None
+            return document_id, "unknown_cik" if unknown_cik else "skipped", None, None, None
+        signatures = boilerplate.document_signatures(result) if index_boilerplate else None
+        return document_id, "parsed", result, None, signatures
+    except MemoryError:
+        return document_id, "failed", None, "MemoryError", None
+    except Exception:
+        return document_id, "failed", None, traceback.format_exc(limit=3), None
+
+
+def parse_documents(document_ids=None, form_types=None, processes=None, max_tasks_per_child=20,
+                    max_memory_mb=None, parser_backend=None, flush_size=20, report_every=100, verbose=False,
+                    boilerplate_index=None):
+    """
+    Parse many documents in parallel with a process pool and upsert the results in parsed_documents in bulk.
+    Skipped and failed documents are recorded with parse_status, except the documents of companies missing
+    from the cik_ticker map: they are selected again once the map is refreshed.
+    :param document_ids: ids of the documents to parse, default select_documents_to_parse(form_types)
+    :param form_types: form types to select when document_ids is None
+    :param processes: number of worker processes, default number of cpus
+    :param max_tasks_per_child: a worker is replaced after this number of documents, to give its memory back
+    :param max_memory_mb: optional max address space of a worker, documents going above it fail with MemoryError
+    :param parser_backend: parser backend, one of mongodb.PARSER_BACKENDS
+    :param flush_size: number of parsed documents written in a single bulk_write
+    :param report_every: print progress every 'report_every' documents
+    :param verbose: print the output of parse_document of every document
+    :param boilerplate_index: boilerplate.BoilerplateIndex updated with the paragraphs of the parsed documents,
+     the signatures are computed by the workers
+    :return: dictionary with the counts of parsed, skipped (unknown_cik for the missing companies)
+     and failed documents
+    """
+    if document_ids is None:
+        document_ids = select_documents_to_parse(form_types)
+    processes = processes or os.cpu_count()
+    print(f"{len(document_ids)} documents to parse with {processes} processes")
+
+    stats = {"parsed": 0, "skipped": 0, "unknown_cik": 0, "failed": 0}
+    failures = {}
+    start_time = time.time()
+
+    # workers must not inherit the parent MongoClient, see mongodb.get_mongodb_client
+    with mongodb.BulkWriter("parsed_documents", flush_size=flush_size) as writer, \
+            multiprocessing.Pool(processes, initializer=_init_worker, initargs=(max_memory_mb,),
+                                 maxtasksperchild=max_tasks_per_child) as pool:
+        tasks = ((document_id, parser_backend, verbose, boilerplate_index is not None) for document_id in document_ids)
+        for i, (document_id, status, result, error, signatures) in enumerate(
+                pool.imap_unordered(_parse_worker, tasks), 1):
+            stats[status] += 1
+            if status == "failed":
+                failures[document_id] = error
+                print(f"failed {document_id}: {error.splitlines()[-1]}")
+                writer.update(document_id, parse_status(status, error))
+            elif status == "skipped":
+                writer.update(document_id, parse_status(status))
+            elif status == "parsed":
+                writer.upsert(result)
+                if signatures is not None:
+                    boilerplate_index.add_signatures(result["cik"], signatures)
+
+            if report_every and i % report_every == 0:
+                duration = time.time() - start_time
+                print(f"{i}/{len(document_ids)} documents in {round(duration, 1)}s "
+                      f"({round(i / duration, 2)} docs/s) {stats}")
+
+    duration = time.time() - start_time
+    stats["duration"] = round(duration, 1)
+    stats["docs_per_second"] = round(len(document_ids) / duration, 2) if duration > 0 else 0
+    stats["write_errors"] = writer.errors
+    stats["failures"] = failures
+    print({k: v for k, v in stats.items() if k != "failures"})
+    return stats
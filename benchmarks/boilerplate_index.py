@@ -0,0 +1,77 @@
+"""
+Throughput of the boilerplate index (boilerplate.BoilerplateIndex, in memory): MinHash signatures and LSH
+clustering of the paragraphs of the sections of a corpus, and share of the section text found to be boilerplate.
+Each filing is indexed as if it was filed by --companies different companies, with a few words changed,
+to simulate language shared across companies.
+
+Usage:
+    python benchmarks/boilerplate_index.py CORPUS_DIR [--form-type 10-K] [--companies 30]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import boilerplate as boilerplate
+import mongodb as mongodb
+from parser_backends import load_corpus
+
+
+def perturb(text, rng, rate=0.01):
+    """
+    :return: text with a share 'rate' of its words dropped
+    """
+    return "\n".join(" ".join(w for w in line.split(" ") if rng.random() >= rate) for line in text.split("\n"))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--companies", type=int, default=30)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(0)
+    sections = []
+    for name, form_type, html in load_corpus(args.corpus, args.form_type):
+        sections += [s["text"] for s in (mongodb.extract_sections(html, form_type) or {}).values()]
+
+    index = boilerplate.BoilerplateIndex(boilerplate.MemoryBoilerplateStore(),
+                                         min_companies=max(2, args.companies // 2))
+    paragraphs = characters = 0
+    signatures_duration = index_duration = 0
+    for cik in range(args.companies):
+        doc = {"sections": {i: {"text": perturb(text, rng)} for i, text in enumerate(sections)}}
+        start = time.perf_counter()
+        signatures = boilerplate.document_signatures(doc)
+        signatures_duration += time.perf_counter() - start
+
+        start = time.perf_counter()
+        index.add_signatures(cik, signatures)
+        index_duration += time.perf_counter() - start
+        paragraphs += len(signatures)
+        characters += sum(len(s["text"]) for s in doc["sections"].values())
+
+    start = time.perf_counter()
+    total = removed = 0
+    for text in sections:
+        clean, _ = index.strip_boilerplate(text)
+        total += len(text)
+        removed += len(text) - len(clean)
+    strip_duration = time.perf_counter() - start
+
+    print(f"{paragraphs} paragraphs, {len(index.store.clusters)} clusters")
+    print(f"signatures: {paragraphs / signatures_duration:,.0f} paragraphs/s "
+          f"({characters / 1e6 / signatures_duration:.1f} MB/s), "
+          f"index: {paragraphs / index_duration:,.0f} paragraphs/s")
+    print(f"boilerplate: {removed / max(total, 1):.1%} of the section text, "
+          f"strip_boilerplate: {total / 1e6 / strip_duration:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Import time of the modules of the project, each imported in a fresh interpreter (python -X importtime),
+and the heaviest packages they pull in. Short-lived workers pay this before doing any work.
+
+With --corpus, it also compares wrapping the section texts in langchain documents with analyzer.text_documents
+and with analyzer.UnstructuredStringLoader (unstructured partitioning), when langchain and unstructured
+are installed.
+
+Usage:
+    python benchmarks/import_time.py [--modules mongodb analyzer] [--runs 5] [--top 5] [--corpus CORPUS_DIR]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+MODULES = ("mongodb", "analyzer", "llm_models", "summary_cache", "batch_parse", "summary_scheduler")
+
+
+def import_times(module):
+    """
+    :param module: module name
+    :return: a tuple (cumulative import time of module in seconds,
+     dictionary package -> cumulative import time in seconds of the packages imported at the top level)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    total = 0
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        seconds = int(cumulative) / 1e6
+        if name.strip() == module and not name.startswith("  "):
+            total = seconds
+        elif name.startswith("   ") and not name.startswith("    "):
+            # first level imports of module (the name is indented by 2 spaces per level)
+            packages[name.strip()] = seconds
+    return total, packages
+
+
+def compare_loaders(corpus_directory):
+    import analyzer as analyzer
+    import mongodb as mongodb
+    from parser_backends import load_corpus
+
+    sections = []
+    for name, form_type, html in load_corpus(corpus_directory, "10-K"):
+        sections += [s["text"] for s in (mongodb.extract_sections(html, form_type) or {}).values()]
+    size = sum(len(s) for s in sections) / 1e6
+
+    start = time.perf_counter()
+    for text in sections:
+        analyzer.text_documents(text)
+    duration = time.perf_counter() - start
+    print(f"text_documents: {len(sections)} sections, {size / duration:,.1f} MB/s")
+
+    try:
+        start = time.perf_counter()
+        for text in sections:
+            analyzer.UnstructuredStringLoader(text).load()
+        duration = time.perf_counter() - start
+        print(f"UnstructuredStringLoader: {len(sections)} sections, {size / duration:,.1f} MB/s")
+    except ImportError as e:
+        print(f"UnstructuredStringLoader skipped: {e}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--modules", nargs="+", default=MODULES)
+    arg_parser.add_argument("--runs", type=int, default=5)
+    arg_parser.add_argument("--top", type=int, default=5)
+    arg_parser.add_argument("--corpus")
+    args = arg_parser.parse_args()
+
+    for module in args.modules:
+        try:
+            runs = [import_times(module) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as e:
+            print(f"{module}: import failed\n{e.stderr.strip().splitlines()[-1]}")
+            continue
+        total = statistics.median(t for t, _ in runs)
+        packages = {name: statistics.median(p.get(name, 0) for _, p in runs) for name in runs[0][1]}
+        heaviest = sorted(packages.items(), key=lambda p: p[1], reverse=True)[:args.top]
+        print(f"{module}: {total * 1000:,.0f} ms (median of {args.runs}), heaviest imports: "
+              + ", ".join(f"{name} {seconds * 1000:,.0f} ms" for name, seconds in heaviest))
+
+    if args.corpus:
+        compare_loaders(args.corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Compare parser backends (BeautifulSoup tree builders and the "stream" sectionizer) on a corpus of filings.
+
+For each backend it reports wall time of extract_sections, the peak resident memory (RSS) of a process running
+only this backend, which includes the C allocations of lxml and html5lib (+parse MB: the increase while parsing),
+and the parity of the sections found with the reference backend (html.parser, the historical default).
+
+Usage:
+    python benchmarks/parser_backends.py CORPUS_DIR [--form-type 10-K] [--backends html.parser lxml html5lib]
+
+CORPUS_DIR contains filings saved as .htm/.html files. The form type of a file is taken from its name
+when it starts with it (e.g. "10-Q_aapl-20230701.htm", "8-K_msft.htm"), otherwise --form-type is used.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import mongodb as mongodb
+
+FORM_TYPES = ("10-K/A", "10-K", "10-Q", "8-K")
+
+
+def load_corpus(directory, default_form_type):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".htm", ".html")):
+            continue
+        form_type = default_form_type
+        for f in FORM_TYPES:
+            if name.upper().startswith(f.replace("/", "") + "_"):
+                form_type = f
+                break
+        with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as fp:
+            corpus.append((name, form_type, fp.read()))
+    return corpus
+
+
+def corpus_documents(corpus):
+    """
+    :param corpus: list of tuples (name, form type, html), see load_corpus
+    :return: parsed_documents like entries of the filings of the corpus with sections, the name is the _id
+    """
+    docs = []
+    for name, form_type, html in corpus:
+        sections = mongodb.extract_sections(html, form_type)
+        if sections:
+            docs.append({"_id": name, "cik": None, "form_type": form_type, "filing_date": None, "sections": sections})
+    return docs
+
+
+def max_rss():
+    """
+    :return: peak resident memory of the current process in bytes
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_backend(corpus, backend):
+    """
+    Should run in its own process (see measure_backend), the peak RSS can't go down once a backend has parsed.
+    :return: a tuple (dictionary file name -> (sections, seconds), peak RSS bytes before parsing,
+     peak RSS bytes after parsing)
+    """
+    results = {}
+    rss_before = max_rss()
+    for name, form_type, html in corpus:
+        start = time.perf_counter()
+        sections = mongodb.extract_sections(html, form_type, backend)
+        results[name] = (sections or {}, time.perf_counter() - start)
+    return results, rss_before, max_rss()
+
+
+def measure_backend(corpus, backend):
+    """
+    run_backend in a new process, the memory of the other backends is not counted in its peak RSS.
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_backend, (corpus, backend))
+
+
+def compare_sections(reference, other):
+    """
+    :return: a tuple (same titles, number of sections with identical text, number of reference sections)
+    """
+    same_titles = list(reference.keys()) == list(other.keys())
+    identical = sum(1 for title, s in reference.items() if title in other and other[title]["text"] == s["text"])
+    return same_titles, identical, len(reference)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--backends", nargs="+", default=list(mongodb.PARSER_BACKENDS))
+    arg_parser.add_argument("--reference", default="html.parser")
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.form_type)
+    print(f"{len(corpus)} filings, {round(sum(len(h) for _, _, h in corpus) / 1e6, 1)}MB of html")
+
+    backends = [args.reference] + [b for b in args.backends if b != args.reference]
+    results = {}
+    for backend in backends:
+        try:
+            results[backend] = measure_backend(corpus, backend)
+        except Exception as e:
+            # e.g. the library of the backend is not installed
+            print(f"{backend}: failed ({e!r})")
+
+    reference = results[args.reference][0]
+    print(f"\n{'backend':<12} {'total s':>9} {'mean s':>8} {'max s':>8} {'RSS MB':>8} {'+parse MB':>10} "
+          f"{'same titles':>12} {'same text':>10}")
+    for backend, (result, rss_before, rss_after) in results.items():
+        durations = [d for _, d in result.values()]
+        same_titles = identical = total = 0
+        for name, (sections, _) in result.items():
+            t, i, n = compare_sections(reference[name][0], sections)
+            same_titles += t
+            identical += i
+            total += n
+        print(f"{backend:<12} {sum(durations):>9.2f} {sum(durations) / max(len(durations), 1):>8.2f} "
+              f"{max(durations, default=0):>8.2f} {rss_after / 1e6:>8.1f} {(rss_after - rss_before) / 1e6:>10.1f} "
+              f"{same_titles:>6}/{len(result):<5} {identical:>4}/{total:<5}")
+
+    print("\nfilings with different sections than the reference:")
+    for backend, (result, _, _) in results.items():
+        if backend == args.reference:
+            continue
+        for name, (sections, _) in result.items():
+            t, i, n = compare_sections(reference[name][0], sections)
+            if not t or i != n:
+                print(f"  {backend}: {name} titles {'same' if t else 'different'}, {i}/{n} sections with same text")
+
+
+if __name__ == "__main__":
+    main()
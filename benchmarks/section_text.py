@@ -0,0 +1,106 @@
+"""
+Before/after benchmark of the text extraction of sections found with the table of contents hrefs
+(mongodb.get_sections_text_with_hrefs), on the largest filings of a corpus.
+
+Usage:
+    python benchmarks/section_text.py CORPUS_DIR [--largest 10] [--form-type 10-K]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bs4 import NavigableString
+from unidecode import unidecode
+import mongodb as mongodb
+from parser_backends import load_corpus
+
+
+def legacy_get_sections_text_with_hrefs(soup, sections):
+    """
+    Previous implementation: string concatenation and unidecode on every string.
+    """
+    next_section = 1
+    current_section = None
+    text = ""
+    last_was_new_line = False
+
+    for el in soup.body.descendants:
+        if next_section in sections and el == sections[next_section]['start_el']:
+            if current_section is not None:
+                sections[current_section]["text"] = text
+                text = ""
+                last_was_new_line = False
+            current_section = next_section
+            next_section += 1
+
+        if current_section is not None and isinstance(el, NavigableString):
+            if last_was_new_line and el.text == "\n":
+                continue
+            elif el.text == "\n":
+                last_was_new_line = True
+            else:
+                last_was_new_line = False
+            found_text = unidecode(el.get_text(separator=" "))
+            if len(text) > 0 and text[-1] != " " and len(found_text) > 0 and found_text[0] != " ":
+                text += "\n"
+            text += found_text.replace('\n', ' ')
+
+    if current_section is not None:
+        sections[current_section]["text"] = text
+
+    return sections
+
+
+def sections_with_hrefs(soup, form_type):
+    list_items = mongodb.list_10q_items if form_type == "10-Q" else mongodb.list_10k_items
+    table_of_contents = mongodb.identify_table_of_contents(soup, list_items)
+    if table_of_contents is None:
+        return None
+    return mongodb.get_sections_using_hrefs(soup, table_of_contents)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--largest", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    corpus = [c for c in load_corpus(args.corpus, args.form_type) if c[1] != "8-K"]
+    corpus = sorted(corpus, key=lambda c: len(c[2]), reverse=True)[:args.largest]
+
+    print(f"{'filing':<40} {'MB':>6} {'sections':>8} {'before s':>9} {'after s':>8} {'speedup':>8} {'same':>5}")
+    total_before = total_after = 0
+    for name, form_type, html in corpus:
+        soup = mongodb.make_soup(html)
+        sections = sections_with_hrefs(soup, form_type)
+        if not sections:
+            print(f"{name:<40} no table of contents with hrefs, skipped")
+            continue
+
+        start = time.perf_counter()
+        after = {k: v["text"] for k, v in mongodb.get_sections_text_with_hrefs(soup, sections).items()}
+        after_duration = time.perf_counter() - start
+
+        start = time.perf_counter()
+        before = {k: v["text"] for k, v in legacy_get_sections_text_with_hrefs(soup, sections).items()}
+        before_duration = time.perf_counter() - start
+
+        total_before += before_duration
+        total_after += after_duration
+        print(f"{name[:40]:<40} {len(html) / 1e6:>6.1f} {len(sections):>8} {before_duration:>9.2f} "
+              f"{after_duration:>8.2f} {before_duration / max(after_duration, 1e-9):>7.1f}x "
+              f"{'yes' if before == after else 'NO':>5}")
+
+    if total_after > 0:
+        print(f"\ntotal: before {total_before:.2f}s, after {total_after:.2f}s, "
+              f"speedup {total_before / total_after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Before/after benchmark of the section titles handling: clean_section_title on every cell of the tables of contents,
+and the classification of the parsed sections titles done by analyzer.restructure_parsed_10k/10q.
+
+Usage:
+    python benchmarks/section_title_rules.py CORPUS_DIR [--form-type 10-K] [--documents 1000]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+The titles of the corpus are repeated to simulate --documents filings.
+"""
+import argparse
+import os
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from unidecode import unidecode
+import mongodb as mongodb
+import section_titles as section_titles
+from parser_backends import load_corpus
+
+
+def legacy_clean_section_title(title):
+    title = title.lower()
+    title = unidecode(title)
+    title = title.replace("item ", "")
+    for idx in range(20, 0, -1):
+        for let in ['', 'a', 'b', 'c']:
+            title = title.replace(f"{idx}{let}.", "")
+    for idx in range(10, 0, -1):
+        title = title.replace(f"f-{idx}", "")
+    title = re.sub(r'\([^)]*\)', '', title).strip(string.punctuation + string.whitespace)
+    return title
+
+
+def legacy_classify_10k(s):
+    found = None
+    if ("business" in s.lower() or "overview" in s.lower() or "company" in s.lower() or "general" in s.lower() or "outlook" in s.lower())\
+            and not "combination" in s.lower():
+        found = "business"
+    elif "propert" in s.lower() and not "plant" in s.lower() and not "business" in s.lower():
+        found = "property"
+    elif "foreign" in s.lower() and "jurisdiction" in s.lower():
+        found = "foreign"
+    elif "legal" in s.lower() and "proceeding" in s.lower():
+        found = "legal"
+    elif "information" in s.lower() and "other" in s.lower():
+        found = "other"
+    elif "unresolved" in s.lower():
+        found = "unresolved"
+    elif "risk" in s.lower():
+        found = "risk"
+    return found
+
+
+def legacy_classify_10q(s):
+    found = None
+    if "legal" in s.lower() and "proceeding" in s.lower():
+        found = "legal"
+    elif "management" in s.lower() and "discussion" in s.lower():
+        found = "MD&A"
+    elif "information" in s.lower() and "other" in s.lower():
+        found = "other"
+    elif "risk" in s.lower():
+        found = "risk"
+    elif "sales" in s.lower() and "equity" in s.lower():
+        found = "equity"
+    elif "default" in s.lower():
+        found = "defaults"
+    return found
+
+
+def corpus_titles(corpus):
+    """
+    :return: a tuple (text of the cells of the tables of contents, titles of the parsed sections)
+    """
+    cells = []
+    titles = []
+    for name, form_type, html in corpus:
+        sections = mongodb.extract_sections(html, form_type)
+        titles += list(sections or {})
+        if form_type == "8-K":
+            continue
+        soup = mongodb.make_soup(html)
+        list_items = mongodb.list_10q_items if form_type == "10-Q" else mongodb.list_10k_items
+        table_of_contents = mongodb.identify_table_of_contents(soup, list_items)
+        if table_of_contents:
+            for _, children_text in mongodb.table_of_contents_rows(table_of_contents):
+                cells += children_text
+    return cells, titles
+
+
+def timed(function, values):
+    start = time.perf_counter()
+    result = [function(v) for v in values]
+    return result, time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--documents", type=int, default=1000)
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.form_type)
+    cells, titles = corpus_titles(corpus)
+    repeat = max(1, args.documents // max(len(corpus), 1))
+    cells, titles = cells * repeat, titles * repeat
+    print(f"{len(cells)} table of contents cells, {len(titles)} section titles")
+
+    section_titles.clean_section_title.cache_clear()
+    section_titles.classify_section_title.cache_clear()
+    comparisons = [
+        ("clean_section_title", cells, legacy_clean_section_title, section_titles.clean_section_title),
+        ("classify 10-K", titles, legacy_classify_10k, lambda t: section_titles.classify_section_title("10-K", t)),
+        ("classify 10-Q", titles, legacy_classify_10q, lambda t: section_titles.classify_section_title("10-Q", t)),
+    ]
+    print(f"\n{'':<20} {'before s':>9} {'after s':>8} {'speedup':>8} {'same':>5}")
+    for name, values, before_function, after_function in comparisons:
+        before, before_duration = timed(before_function, values)
+        after, after_duration = timed(after_function, values)
+        print(f"{name:<20} {before_duration:>9.3f} {after_duration:>8.3f} "
+              f"{before_duration / max(after_duration, 1e-9):>7.1f}x {'yes' if before == after else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
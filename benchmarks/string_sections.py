@@ -0,0 +1,70 @@
+"""
+Benchmark of the string fallback of the sections extraction (mongodb.get_sections_using_strings),
+used when the table of contents has no hrefs (all the 8-K filings and part of the 10-K/10-Q filings).
+The sections found are checked against the previous implementation by tests/test_string_sections.py.
+
+Usage:
+    python benchmarks/string_sections.py CORPUS_DIR [--form-type 10-K] [--repeat 3]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import mongodb as mongodb
+from parser_backends import load_corpus
+
+
+FORMS = {
+    "10-K": (mongodb.list_10k_items, mongodb.default_10k_sections),
+    "10-K/A": (mongodb.list_10k_items, mongodb.default_10k_sections),
+    "10-Q": (mongodb.list_10q_items, mongodb.default_10q_sections),
+    "8-K": (None, mongodb.default_8k_sections),
+}
+
+
+def timed(function, repeat, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return result, best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.form_type)
+
+    print(f"{'filing':<40} {'MB':>6} {'sections':>8} {'toc':>4} {'s':>8} {'MB/s':>7}")
+    total_size = total_duration = 0
+    for name, form_type, html in corpus:
+        list_items, default_sections = FORMS[form_type]
+        soup = mongodb.make_soup(html)
+        if soup.body is None:
+            continue
+        table_of_contents = mongodb.identify_table_of_contents(soup, list_items)
+        sections, duration = timed(mongodb.get_sections_using_strings, args.repeat,
+                                   soup, table_of_contents, default_sections)
+
+        total_size += len(html) / 1e6
+        total_duration += duration
+        print(f"{name[:40]:<40} {len(html) / 1e6:>6.1f} {len(sections):>8} "
+              f"{'yes' if table_of_contents else 'no':>4} {duration:>8.3f} {len(html) / 1e6 / duration:>7.1f}")
+
+    if total_duration > 0:
+        print(f"\ntotal: {total_size:.1f} MB in {total_duration:.2f}s, {total_size / total_duration:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
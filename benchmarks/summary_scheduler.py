@@ -0,0 +1,69 @@
+"""
+Sequential vs concurrent summarization of the sections of a corpus, with summary_scheduler.FakeLLM
+simulating the latency and the rate limits of the OpenAI API (nothing is sent to OpenAI or stored in MongoDB).
+
+Usage:
+    python benchmarks/summary_scheduler.py CORPUS_DIR [--form-type 10-K] [--latency 0.2]
+        [--requests-per-minute 600] [--tokens-per-minute 400000]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import summary_scheduler as summary_scheduler
+from parser_backends import corpus_documents, load_corpus
+
+
+def run(docs, args, max_concurrency, max_concurrent_documents, scheduler_limits=True):
+    llm = summary_scheduler.FakeLLM(latency=args.latency, requests_per_minute=args.requests_per_minute,
+                                    tokens_per_minute=args.tokens_per_minute)
+    # without limits the scheduler relies only on the retries to stay within the API limits
+    factor = 1 if scheduler_limits else 100
+
+    async def summarize():
+        scheduler = summary_scheduler.SummaryScheduler(
+            llm, requests_per_minute=args.requests_per_minute * factor,
+            tokens_per_minute=args.tokens_per_minute * factor, max_concurrency=max_concurrency,
+            backoff_factor=0.5, cache=False)
+        reports = await scheduler.summarize_documents(docs, max_concurrent_documents, store=False)
+        return reports, scheduler.retries
+
+    start = time.perf_counter()
+    reports, retries = asyncio.run(summarize())
+    return time.perf_counter() - start, reports, retries, llm
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--latency", type=float, default=0.2)
+    arg_parser.add_argument("--requests-per-minute", type=int, default=600)
+    arg_parser.add_argument("--tokens-per-minute", type=int, default=400000)
+    args = arg_parser.parse_args()
+
+    docs = corpus_documents(load_corpus(args.corpus, args.form_type))
+    runs = [
+        ("sequential", 1, 1, True),
+        ("concurrent", 16, 8, True),
+        ("concurrent, no budgets", 16, 8, False),
+    ]
+    results = []
+    for name, max_concurrency, max_concurrent_documents, scheduler_limits in runs:
+        results.append((name,) + run(docs, args, max_concurrency, max_concurrent_documents, scheduler_limits))
+
+    print(f"\n{len(docs)} documents")
+    print(f"{'':<24} {'wall s':>7} {'calls':>6} {'tokens':>9} {'rejected':>9} {'retries':>8} {'errors':>7}")
+    for name, duration, reports, retries, llm in results:
+        errors = sum(len(r["errors"]) for r in reports if r is not None)
+        print(f"{name:<24} {duration:>7.1f} {llm.calls:>6} {llm.tokens:>9} {llm.rejected:>9} {retries:>8} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
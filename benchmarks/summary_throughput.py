@@ -0,0 +1,103 @@
+"""
+Throughput and cost accounting of analyzer.documents_summary on a corpus, offline: the models are answered by
+llm_backend.FakeBackend (deterministic answers, simulated latency and connection time), nothing is sent to OpenAI
+or stored in MongoDB.
+
+Runs:
+- a new client and chain for every call (pooled=False), without and with packing of the short sections
+- clients and chains reused (pooled=True), without and with packing
+- the sections summarized concurrently by summary_scheduler with a pool of threads sharing the backend
+
+For each run it reports wall time, sections per second, LLM calls, tokens, clients created, and checks that
+the cost returned matches the cost counted by the backend and that the summaries are the same as the first run.
+
+Usage:
+    python benchmarks/summary_throughput.py CORPUS_DIR [--form-type 10-K] [--latency 0.05]
+        [--connect-latency 0.1] [--threads 16]
+
+CORPUS_DIR contains filings saved as .htm/.html files (see benchmarks/parser_backends.py).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import analyzer as analyzer
+import llm_backend as llm_backend
+import summary_scheduler as summary_scheduler
+from parser_backends import corpus_documents, load_corpus
+
+
+def summaries(results):
+    """
+    :param results: summary documents
+    :return: dictionary (_id, section title) -> summary
+    """
+    return {(result["_id"], title): value["summary"] for result in results
+            for title, value in result.items() if isinstance(value, dict)}
+
+
+def run_documents_summary(docs, backend, pack):
+    llm_backend.set_llm_backend(backend)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, cost = analyzer.documents_summary(docs, cache=False, pack=pack, incremental=False, store=False)
+    return summaries(results.values()), cost
+
+
+def run_scheduler(docs, backend, threads):
+    async def summarize():
+        llm = summary_scheduler.OpenAISummarizer(max_workers=threads, backend=backend)
+        # budgets high enough to never wait
+        scheduler = summary_scheduler.SummaryScheduler(llm, requests_per_minute=10 ** 6, tokens_per_minute=10 ** 9,
+                                                       max_concurrency=threads, cache=False)
+        return await asyncio.gather(*(scheduler.summarize_document(doc, store=False) for doc in docs))
+
+    outcomes = [(result, report) for result, report in asyncio.run(summarize()) if result is not None]
+    return summaries(result for result, _ in outcomes), sum(report["cost"] for _, report in outcomes)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("corpus")
+    arg_parser.add_argument("--form-type", default="10-K")
+    arg_parser.add_argument("--latency", type=float, default=0.05)
+    arg_parser.add_argument("--connect-latency", type=float, default=0.1)
+    arg_parser.add_argument("--threads", type=int, default=16)
+    args = arg_parser.parse_args()
+
+    docs = corpus_documents(load_corpus(args.corpus, args.form_type))
+
+    def backend(pooled):
+        return llm_backend.FakeBackend(latency=args.latency, connect_latency=args.connect_latency, pooled=pooled)
+
+    runs = [
+        ("new clients", lambda b: run_documents_summary(docs, b, pack=False), False),
+        ("new clients, packed", lambda b: run_documents_summary(docs, b, pack=True), False),
+        ("pooled", lambda b: run_documents_summary(docs, b, pack=False), True),
+        ("pooled, packed", lambda b: run_documents_summary(docs, b, pack=True), True),
+        (f"pooled, {args.threads} threads", lambda b: run_scheduler(docs, b, args.threads), True),
+    ]
+    reference = None
+    print(f"{len(docs)} documents")
+    print(f"{'':<22} {'wall s':>7} {'sections/s':>11} {'calls':>6} {'tokens':>9} {'clients':>8} {'cost $':>9} "
+          f"{'cost ok':>8} {'same':>5}")
+    for name, run, pooled in runs:
+        b = backend(pooled)
+        start = time.perf_counter()
+        results, cost = run(b)
+        duration = time.perf_counter() - start
+        stats = b.stats()
+        tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+        reference = reference or results
+        same = results == reference
+        print(f"{name:<22} {duration:>7.2f} {len(results) / duration:>11.1f} {stats['calls']:>6} {tokens:>9} "
+              f"{stats['clients']:>8} {cost:>9.4f} {str(abs(cost - stats['cost']) < 1e-4):>8} {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import functools
+import hashlib
+import re
+import zlib
+import numpy as np
+from bson import Binary
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+import mongodb as mongodb
+import incremental_summary as incremental_summary
+
+# Index of the paragraphs repeated across filings (forward-looking statements disclaimers, standard risk factors,
+# exhibit legends, ...), to avoid summarizing them thousands of times.
+# Paragraphs are shingled in word 5-grams and hashed with MinHash. Near-duplicate paragraphs (estimated Jaccard
+# similarity >= SIMILARITY_THRESHOLD) are grouped in clusters, found with LSH: the signature is cut in BANDS
+# bands, and paragraphs sharing the hash of a band are compared. A cluster keeps the companies (cik) using it:
+# a paragraph of a cluster shared by BOILERPLATE_MIN_COMPANIES companies is boilerplate.
+# The index stores clusters, not paragraphs, so it grows with the distinct language of the corpus.
+#     index = BoilerplateIndex()
+#     index.add_document(parsed_document)
+#     text, removed = index.strip_boilerplate(section_text)
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 128
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+# paragraphs with fewer words are not indexed (titles, table cells)
+MIN_PARAGRAPH_WORDS = 20
+SIMILARITY_THRESHOLD = 0.8
+BOILERPLATE_MIN_COMPANIES = 20
+BOILERPLATE_COLLECTION = "boilerplate_clusters"
+# characters of the first paragraph of a cluster kept as sample
+SAMPLE_CHARACTERS = 300
+
+MERSENNE_PRIME = (1 << 31) - 1
+_random = np.random.RandomState(1)
+PERMUTATION_A = _random.randint(1, MERSENNE_PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+PERMUTATION_B = _random.randint(0, MERSENNE_PRIME, NUM_PERMUTATIONS).astype(np.uint64)
+SHINGLE_MULTIPLIER = np.uint64(1000003)
+WORD = re.compile(r"[a-z0-9]+")
+
+
+@functools.lru_cache(maxsize=1 << 18)
+def word_hash(word):
+    return zlib.crc32(word.encode("utf-8"))
+
+
+def shingles(paragraph):
+    """
+    :param paragraph: a string
+    :return: array of the distinct hashes of the word SHINGLE_SIZE-grams of the paragraph, None if it is too short
+    """
+    words = WORD.findall(paragraph.lower())
+    if len(words) < MIN_PARAGRAPH_WORDS:
+        return None
+    hashes = np.fromiter(map(word_hash, words), dtype=np.uint64, count=len(words))
+    # polynomial hash of each window of SHINGLE_SIZE words (uint64 arithmetic wraps around)
+    count = len(words) - SHINGLE_SIZE + 1
+    grams = np.zeros(count, dtype=np.uint64)
+    for i in range(SHINGLE_SIZE):
+        grams = grams * SHINGLE_MULTIPLIER + hashes[i:i + count]
+    return np.unique(grams >> np.uint64(32))
+
+
+def minhash(shingle_hashes):
+    """
+    :param shingle_hashes: result of shingles
+    :return: MinHash signature, array of NUM_PERMUTATIONS uint32
+    """
+    values = shingle_hashes % MERSENNE_PRIME
+    hashed = (PERMUTATION_A[:, None] * values[None, :] + PERMUTATION_B[:, None]) % MERSENNE_PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_hashes(signature):
+    """
+    :param signature: MinHash signature
+    :return: list of BANDS int64 hashes, one for each band of ROWS values (and the band number)
+    """
+    return [int.from_bytes(hashlib.blake2b(bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                           digest_size=8).digest(), "big", signed=True)
+            for band in range(BANDS)]
+
+
+def similarity(signature, other):
+    """
+    :return: Jaccard similarity of two paragraphs estimated from their signatures
+    """
+    return float(np.mean(signature == other))
+
+
+def paragraph_signatures(text):
+    """
+    :param text: section text
+    :return: list of tuples (paragraph, signature) of the paragraphs long enough to be indexed
+    """
+    result = []
+    for paragraph in incremental_summary.split_paragraphs(text):
+        hashes = shingles(paragraph)
+        if hashes is not None:
+            result.append((paragraph, minhash(hashes)))
+    return result
+
+
+def document_signatures(doc):
+    """
+    :param doc: a parsed_documents entry
+    :return: list of tuples (paragraph sample, signature) of all its sections, computed in batch_parse workers
+    """
+    return [(paragraph[:SAMPLE_CHARACTERS], signature)
+            for section in doc["sections"].values() for paragraph, signature in paragraph_signatures(section["text"])]
+
+
+class MemoryBoilerplateStore:
+    """
+    Clusters kept in memory, for tests and one-off analyses.
+    """
+
+    def __init__(self):
+        self.clusters = {}
+        self.buckets = {}
+
+    def candidates(self, bands):
+        ids = set()
+        for band in bands:
+            ids.update(self.buckets.get(band, ()))
+        return [dict(self.clusters[i], _id=i) for i in ids]
+
+    def write(self, new_clusters, updates):
+        """
+        :param new_clusters: list of cluster documents to insert
+        :param updates: dictionary cluster id -> (number of paragraphs to add, cik to add or None)
+        """
+        for cluster in new_clusters:
+            self.clusters[cluster["_id"]] = dict(cluster, ciks=list(cluster["ciks"]))
+            for band in cluster["bands"]:
+                self.buckets.setdefault(band, set()).add(cluster["_id"])
+        for cluster_id, (paragraphs, cik) in updates.items():
+            cluster = self.clusters[cluster_id]
+            cluster["paragraphs"] += paragraphs
+            if cik is not None and cik not in cluster["ciks"]:
+                cluster["ciks"].append(cik)
+
+    def with_companies(self, ciks, min_companies):
+        return [dict(c, _id=i) for i, c in self.clusters.items()
+                if all(cik in c["ciks"] for cik in ciks) and len(c["ciks"]) >= min_companies]
+
+
+class MongoBoilerplateStore:
+    """
+    Clusters stored in a MongoDB collection, with multikey indexes on the band hashes and on the companies.
+    """
+
+    def __init__(self, collection_name=BOILERPLATE_COLLECTION):
+        self.collection_name = collection_name
+        self.indexed = False
+
+    def _collection(self):
+        collection = mongodb.get_collection(self.collection_name)
+        if not self.indexed:
+            collection.create_index("bands")
+            collection.create_index("ciks")
+            self.indexed = True
+        return collection
+
+    def candidates(self, bands):
+        if not bands:
+            return []
+        clusters = self._collection().find({"bands": {"$in": list(set(bands))}}, {"signature": 1, "bands": 1, "ciks": 1})
+        return [dict(c, signature=np.frombuffer(c["signature"], dtype=np.uint32)) for c in clusters]
+
+    def write(self, new_clusters, updates):
+        operations = [InsertOne(dict(c, signature=Binary(c["signature"].tobytes()))) for c in new_clusters]
+        for cluster_id, (paragraphs, cik) in updates.items():
+            update = {"$inc": {"paragraphs": paragraphs}}
+            if cik is not None:
+                update["$addToSet"] = {"ciks": cik}
+            operations.append(UpdateOne({"_id": cluster_id}, update))
+        if not operations:
+            return
+        try:
+            self._collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # 11000: duplicate key, the cluster was inserted by another process
+            for err in e.details["writeErrors"]:
+                if err["code"] != 11000:
+                    print(f"bulk write error on {self.collection_name}: {err['errmsg'][:200]}")
+
+    def with_companies(self, ciks, min_companies):
+        query = {"ciks": {"$all": list(ciks)}} if ciks else {}
+        query[f"ciks.{min_companies - 1}"] = {"$exists": True}
+        return [dict(c, signature=np.frombuffer(c["signature"], dtype=np.uint32))
+                for c in self._collection().find(query)]
+
+
+class BoilerplateIndex:
+    """
+    Near-duplicate index of the paragraphs of the filings, updated one document at a time.
+    """
+
+    def __init__(self, store=None, threshold=SIMILARITY_THRESHOLD, min_companies=BOILERPLATE_MIN_COMPANIES):
+        self.store = store if store is not None else MongoBoilerplateStore()
+        self.threshold = threshold
+        self.min_companies = min_companies
+
+    def _match(self, signatures):
+        """
+        :param signatures: list of signatures
+        :return: for each signature its band hashes and the best matching cluster among the candidates, or None
+        """
+        bands = [band_hashes(signature) for signature in signatures]
+        candidates = self.store.candidates([b for paragraph_bands in bands for b in paragraph_bands])
+        by_band = {}
+        for cluster in candidates:
+            for band in cluster["bands"]:
+                by_band.setdefault(band, []).append(cluster)
+
+        matches = []
+        for signature, paragraph_bands in zip(signatures, bands):
+            best, best_similarity = None, self.threshold
+            for band in paragraph_bands:
+                for cluster in by_band.get(band, ()):
+                    s = similarity(signature, cluster["signature"])
+                    if s >= best_similarity:
+                        best, best_similarity = cluster, s
+            matches.append(best)
+        return bands, matches
+
+    def add_signatures(self, cik, signatures):
+        """
+        Add the paragraphs of a document to the index.
+        :param cik: company of the document
+        :param signatures: list of tuples (paragraph, signature), see document_signatures
+        :return: number of paragraphs that matched an existing cluster
+        """
+        bands, matches = self._match([signature for _, signature in signatures])
+        new_clusters = {}
+        new_by_band = {}
+        updates = {}
+        matched = 0
+        for (paragraph, signature), paragraph_bands, cluster in zip(signatures, bands, matches):
+            if cluster is None:
+                # near-duplicate of a paragraph added earlier in the same document
+                for band in paragraph_bands:
+                    cluster = next((c for c in new_by_band.get(band, ())
+                                    if similarity(signature, c["signature"]) >= self.threshold), None)
+                    if cluster is not None:
+                        break
+            if cluster is None:
+                cluster = {"_id": hashlib.sha1(signature.tobytes()).hexdigest(), "signature": signature,
+                           "bands": paragraph_bands, "ciks": [cik], "paragraphs": 0,
+                           "sample": paragraph[:SAMPLE_CHARACTERS]}
+                new_clusters[cluster["_id"]] = cluster
+                for band in paragraph_bands:
+                    new_by_band.setdefault(band, []).append(cluster)
+            else:
+                matched += 1
+            if cluster["_id"] in new_clusters:
+                cluster["paragraphs"] += 1
+            else:
+                count, _ = updates.get(cluster["_id"], (0, None))
+                updates[cluster["_id"]] = (count + 1, cik)
+        self.store.write(list(new_clusters.values()), updates)
+        return matched
+
+    def add_document(self, doc):
+        """
+        :param doc: a parsed_documents entry
+        :return: number of paragraphs that matched an existing cluster
+        """
+        return self.add_signatures(doc["cik"], document_signatures(doc))
+
+    def find_boilerplate(self, text):
+        """
+        :param text: section text
+        :return: list of tuples (paragraph, cluster or None), the cluster is given for boilerplate paragraphs
+        """
+        paragraphs = incremental_summary.split_paragraphs(text)
+        indexed = [(i, shingles(p)) for i, p in enumerate(paragraphs)]
+        indexed = [(i, minhash(hashes)) for i, hashes in indexed if hashes is not None]
+        clusters = [None] * len(paragraphs)
+        if indexed:
+            _, matches = self._match([signature for _, signature in indexed])
+            for (i, _), cluster in zip(indexed, matches):
+                if cluster is not None and len(cluster["ciks"]) >= self.min_companies:
+                    clusters[i] = cluster
+        return list(zip(paragraphs, clusters))
+
+    def strip_boilerplate(self, text):
+        """
+        Remove the boilerplate paragraphs of a section before summarizing it.
+        :param text: section text
+        :return: a tuple (text without the boilerplate paragraphs, list of the removed paragraphs);
+         text is returned unchanged if it has no boilerplate
+        """
+        paragraphs = self.find_boilerplate(text)
+        removed = [p for p, cluster in paragraphs if cluster is not None]
+        if not removed:
+            return text, []
+        return "\n".join(p for p, cluster in paragraphs if cluster is None), removed
+
+    def shared_language(self, ciks, min_companies=2):
+        """
+        :param ciks: companies, e.g. [cik_a, cik_b]
+        :param min_companies: minimum number of companies using the paragraphs
+        :return: list of the clusters used by all the companies: "sample", "ciks", "paragraphs"
+        """
+        clusters = self.store.with_companies(ciks, min_companies)
+        return sorted(({"sample": c["sample"], "ciks": c["ciks"], "paragraphs": c["paragraphs"]} for c in clusters),
+                      key=lambda c: len(c["ciks"]), reverse=True)
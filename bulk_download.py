@@ -0,0 +1,216 @@
+import asyncio
+import time
+import pandas as pd
+import mongodb as mongodb
+from edgar_client import AsyncEdgarClient
+
+
+class StageStats:
+    """
+    Keep track of throughput of a pipeline stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.start_time = None
+        self.end_time = None
+
+    def add(self, n_bytes=0):
+        if self.start_time is None:
+            self.start_time = time.time()
+        self.count += 1
+        self.bytes += n_bytes
+        self.end_time = time.time()
+
+    def error(self):
+        if self.start_time is None:
+            self.start_time = time.time()
+        self.errors += 1
+        self.end_time = time.time()
+
+    @property
+    def duration(self):
+        if self.start_time is None:
+            return 0
+        return self.end_time - self.start_time
+
+    @property
+    def throughput(self):
+        return self.count / self.duration if self.duration > 0 else 0
+
+    def __str__(self):
+        return f"{self.name}: {self.count} done, {self.errors} errors, {round(self.bytes / 1e6, 1)}MB " \
+               f"in {round(self.duration, 1)}s ({round(self.throughput, 2)}/s)"
+
+
+def resolve_ciks(ciks_or_tickers):
+    """
+    Convert a list of ciks and/or tickers to 10 digits ciks.
+    :param ciks_or_tickers: a list of int ciks, string ciks or tickers
+    :return: list of ciks, tickers that can't be resolved are skipped
+    """
+    tickers = [str(v).upper() for v in ciks_or_tickers if not isinstance(v, int) and not str(v).isdigit()]
+    companies = mongodb.cik_ticker_resolver.resolve_many(tickers) if tickers else {}
+
+    ciks = []
+    for value in ciks_or_tickers:
+        if isinstance(value, int):
+            ciks.append(mongodb.add_trailing_to_cik(value))
+        elif str(value).isdigit():
+            ciks.append(str(value).zfill(10))
+        else:
+            company = companies[str(value).upper()]
+            if company is None:
+                print(f"ticker {value} not found in cik_ticker map")
+                continue
+            ciks.append(company["cik"])
+    # remove duplicates keeping the order
+    return list(dict.fromkeys(ciks))
+
+
+def tickers_from_screener(file_name="nasdaq_screener_1729013554057.csv"):
+    """
+    Read the tickers of a Nasdaq screener csv export.
+    :param file_name: the csv file
+    :return: list of tickers
+    """
+    df = pd.read_csv(file_name)
+    return df["Symbol"].dropna().str.strip().tolist()
+
+
+async def _submissions_worker(client, cik_queue, filing_queue, forms_to_download, years, update_submissions, stats,
+                              queued_urls):
+    loop = asyncio.get_running_loop()
+    while True:
+        cik = await cik_queue.get()
+        try:
+            if update_submissions:
+                fetched = await client.get_json(f"https://data.sec.gov/submissions/CIK{cik}.json")
+                if fetched is None:
+                    stats["submissions"].error()
+                    continue
+                stored = await loop.run_in_executor(None, mongodb.get_collection("submissions").find_one, {"_id": cik})
+                history_pages = []
+                for name in mongodb.submissions_history_pages_to_fetch(stored, fetched, years):
+                    page = await client.get_json(f"https://data.sec.gov/submissions/{name}")
+                    if page is not None:
+                        history_pages.append(page)
+                submissions, _ = mongodb.merge_submissions(cik, stored, fetched, history_pages)
+                await loop.run_in_executor(None, mongodb.upsert_document, "submissions", submissions)
+            else:
+                try:
+                    submissions = await loop.run_in_executor(None, mongodb.get_document, "submissions", cik)
+                except StopIteration:
+                    print(f"submissions file not found in mongodb for {cik}")
+                    stats["submissions"].error()
+                    continue
+            stats["submissions"].add()
+
+            filings = list(mongodb.iter_submission_filings(submissions, forms_to_download, years))
+            existing = await loop.run_in_executor(None, mongodb.get_existing_document_ids, "documents",
+                                                  [url for url, _, _ in filings])
+            for url, form_type, filing_date in filings:
+                # filings with co-registrants are listed in the submissions of each company
+                if url in queued_urls:
+                    continue
+                queued_urls.add(url)
+                if url in existing:
+                    stats["skipped"].add()
+                    continue
+                await filing_queue.put((url, cik, form_type, filing_date))
+        except Exception as e:
+            print(f"submissions {cik} failed: {e!r}")
+            stats["submissions"].error()
+        finally:
+            cik_queue.task_done()
+
+
+async def _documents_worker(client, filing_queue, writer, stats):
+    loop = asyncio.get_running_loop()
+    while True:
+        url, cik, form_type, filing_date = await filing_queue.get()
+        try:
+            html = await client.get_text(url)
+            if html is None:
+                stats["documents"].error()
+                continue
+            stats["documents"].add(len(html))
+            await loop.run_in_executor(None, mongodb.store_document, url, cik, form_type, filing_date, html, None,
+                                       writer)
+            stats["buffered"].add()
+        except Exception as e:
+            print(f"document {url} failed: {e!r}")
+            stats["documents"].error()
+        finally:
+            filing_queue.task_done()
+
+
+async def download_many_async(ciks_or_tickers, forms_to_download=("10-Q", "10-K", "8-K"), years=5,
+                              update_submissions=True, submissions_workers=4, documents_workers=16,
+                              flush_size=50, flush_interval=10, report_every=30):
+    """
+    Download submissions and documents of many companies concurrently.
+    Submissions json are fetched (and upserted) first, their filings are then queued and downloaded
+    by a pool of workers and streamed into the "documents" collection.
+    All requests share the process-wide EDGAR rate limit, so with enough workers the limit stays saturated.
+    :param ciks_or_tickers: a list of ciks and/or tickers
+    :param forms_to_download: a tuple containing the form types to download
+    :param years: the max number of years to download
+    :param update_submissions: if True download the submissions json from EDGAR, otherwise read them from MongoDB
+    :param submissions_workers: number of concurrent submissions downloads
+    :param documents_workers: number of concurrent document downloads
+    :param flush_size: number of documents written to MongoDB in a single bulk_write
+    :param flush_interval: max seconds a downloaded document waits in the write buffer
+    :param report_every: seconds between progress reports, None to disable them
+    :return: a dictionary of StageStats
+    """
+    ciks = resolve_ciks(ciks_or_tickers)
+    stats = {name: StageStats(name) for name in ["submissions", "documents", "buffered", "skipped"]}
+
+    cik_queue = asyncio.Queue()
+    for cik in ciks:
+        cik_queue.put_nowait(cik)
+    # bounded, so submissions workers don't run too far ahead of document downloads
+    filing_queue = asyncio.Queue(maxsize=documents_workers * 4)
+    queued_urls = set()
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_every)
+            print(" | ".join(str(s) for s in stats.values()))
+
+    writer = mongodb.BulkWriter("documents", flush_size=flush_size, flush_interval=flush_interval)
+
+    async with AsyncEdgarClient() as client:
+        workers = [asyncio.create_task(
+            _submissions_worker(client, cik_queue, filing_queue, forms_to_download, years, update_submissions, stats,
+                                queued_urls))
+            for _ in range(submissions_workers)]
+        workers += [asyncio.create_task(_documents_worker(client, filing_queue, writer, stats))
+                    for _ in range(documents_workers)]
+        if report_every:
+            workers.append(asyncio.create_task(report()))
+
+        await cik_queue.join()
+        await filing_queue.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    await asyncio.get_running_loop().run_in_executor(None, writer.close)
+    print(f"documents written: {writer.written}, write errors: {writer.errors}")
+
+    for s in stats.values():
+        print(s)
+    return stats
+
+
+def download_many(ciks_or_tickers, forms_to_download=("10-Q", "10-K", "8-K"), years=5, **kwargs):
+    """
+    Blocking version of download_many_async.
+    In a notebook, where an event loop is already running, use "await download_many_async(...)" instead.
+    """
+    return asyncio.run(download_many_async(ciks_or_tickers, forms_to_download, years, **kwargs))
@@ -0,0 +1,289 @@
+import asyncio
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from http_cache import HttpCache, DEFAULT_MAX_SIZE
+
+# SEC fair access policy: at most 10 requests per second per user, with a declared User-Agent
+# https://www.sec.gov/os/webmaster-faq#developers
+EDGAR_MAX_REQUESTS_PER_SECOND = 10
+EDGAR_HEADERS = {
+    "User-Agent": "radnom@ten.edu",
+    "Accept-Encoding": "gzip, deflate"
+}
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# on-disk cache of EDGAR responses, disabled unless configure_cache is called
+EDGAR_CACHE_DIRECTORY = ".edgar_cache"
+EDGAR_CACHE_TTL = 3600
+EDGAR_CACHE_MAX_SIZE = DEFAULT_MAX_SIZE
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Tokens are refilled continuously at 'rate' tokens per second, up to 'capacity'.
+    The bucket can be shared between threads (acquire) and asyncio tasks (reserve + asyncio.sleep).
+    """
+
+    def __init__(self, rate=EDGAR_MAX_REQUESTS_PER_SECOND, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take 'tokens' from the bucket, going into debt if needed.
+        :param tokens: number of tokens to take
+        :return: seconds the caller has to wait before using the reserved tokens
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Block until 'tokens' are available.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class EdgarClient:
+    """
+    HTTP client for EDGAR (Electronic Data Gathering, Analysis and Retrieval).
+    It keeps a persistent keep-alive session, limits the request rate with a token bucket
+    and retries with exponential backoff on 429 and 5xx responses.
+    """
+
+    def __init__(self, rate_limiter=None, headers=None, max_retries=5, backoff_factor=0.5,
+                 max_backoff=60, timeout=30, cache=None):
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.cache = cache
+        self.headers = dict(EDGAR_HEADERS if headers is None else headers)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        # EDGAR is served by a few hosts (www.sec.gov, data.sec.gov), keep enough connections for threaded callers
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def backoff_delay(self, attempt, response=None):
+        """
+        Compute how long to wait before retrying.
+        A 'Retry-After' header sent by the server takes precedence over exponential backoff.
+        :param attempt: retry attempt number, starting from 0
+        :param response: the failed response, if any
+        :return: seconds to wait
+        """
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None and retry_after.isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+
+    def get(self, url):
+        """
+        GET request, served from the cache when possible.
+        :param url: EDGAR url
+        :return: response
+        """
+        if self.cache is None:
+            return self.request(url)
+        return self.cache.get(url, lambda u, headers: self.request(u, headers=headers))
+
+    def request(self, url, **kwargs):
+        """
+        Rate limited GET request with retries.
+        :param url: EDGAR url
+        :return: response (the last one received if all retries failed)
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return response
+
+            print(f"EDGAR returned {response.status_code} for {url}, retry {attempt + 1}/{self.max_retries}")
+            time.sleep(self.backoff_delay(attempt, response))
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncEdgarClient:
+    """
+    asyncio version of EdgarClient, based on aiohttp.
+    It shares the process-wide token bucket with the synchronous client, so threads and
+    asyncio tasks together never exceed the EDGAR rate limit.
+    Use it as an async context manager:
+        async with AsyncEdgarClient() as client:
+            data = await client.get_json(url)
+    """
+
+    def __init__(self, rate_limiter=None, headers=None, max_retries=5, backoff_factor=0.5,
+                 max_backoff=60, timeout=30, max_connections=32):
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.headers = dict(EDGAR_HEADERS if headers is None else headers)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.session = None
+
+    async def __aenter__(self):
+        import aiohttp
+
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.max_connections))
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    async def get(self, url):
+        """
+        Rate limited GET request with retries.
+        :param url: EDGAR url
+        :return: a tuple (status code, body bytes)
+        """
+        import aiohttp
+
+        attempt = 0
+        while True:
+            wait = self.rate_limiter.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with self.session.get(url) as response:
+                    body = await response.read()
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(min(self.backoff_factor * (2 ** attempt), self.max_backoff))
+                attempt += 1
+                continue
+
+            if status not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                return status, body
+
+            if retry_after is not None and retry_after.isdigit():
+                delay = min(float(retry_after), self.max_backoff)
+            else:
+                delay = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+            print(f"EDGAR returned {status} for {url}, retry {attempt + 1}/{self.max_retries}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def get_json(self, url):
+        """
+        :param url: EDGAR url of a json file
+        :return: the parsed json, None if the request failed
+        """
+        status, body = await self.get(url)
+        if status != 200:
+            print(f"EDGAR returned {status} for {url}")
+            return None
+        return json.loads(body)
+
+    async def get_text(self, url):
+        """
+        :param url: EDGAR url of a document
+        :return: the document decoded as text, None if the request failed
+        """
+        status, body = await self.get(url)
+        if status != 200:
+            print(f"EDGAR returned {status} for {url}")
+            return None
+        try:
+            return body.decode("utf-8")
+        except UnicodeDecodeError:
+            # older filings are often windows-1252/latin-1 encoded
+            return body.decode("latin-1")
+
+
+_rate_limiter = None
+_client = None
+_lock = threading.RLock()
+
+
+def get_rate_limiter():
+    """
+    Get the process-wide EDGAR token bucket, shared by every client in the process.
+    :return: TokenBucket
+    """
+    global _rate_limiter
+    with _lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(EDGAR_MAX_REQUESTS_PER_SECOND)
+        return _rate_limiter
+
+
+def set_rate_limit(requests_per_second):
+    """
+    Change the process-wide EDGAR request rate.
+    :param requests_per_second: maximum number of requests per second
+    """
+    limiter = get_rate_limiter()
+    with limiter.lock:
+        limiter.rate = float(requests_per_second)
+        limiter.capacity = float(requests_per_second)
+        limiter.tokens = min(limiter.tokens, limiter.capacity)
+
+
+def get_edgar_client():
+    """
+    Get the shared EDGAR client, creating it on first use.
+    :return: EdgarClient
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            _client = EdgarClient(rate_limiter=get_rate_limiter())
+        return _client
+
+
+def configure_cache(directory=EDGAR_CACHE_DIRECTORY, ttl=EDGAR_CACHE_TTL, offline=False,
+                    max_size=EDGAR_CACHE_MAX_SIZE):
+    """
+    Enable and configure the on-disk cache of the shared EDGAR client, the client has no cache by default.
+    Archive documents are cached forever, other files (company_tickers_exchange.json, submissions json)
+    are revalidated with EDGAR after 'ttl' seconds.
+    :param directory: cache directory, None disables the cache
+    :param ttl: seconds before revalidating index files
+    :param offline: if True never make requests, serve responses only from the cache (replay mode)
+    :param max_size: bytes of responses kept on disk, the least recently used are removed above it
+    """
+    client = get_edgar_client()
+    with _lock:
+        client.cache = HttpCache(directory, ttl=ttl, offline=offline, max_size=max_size) if directory else None
@@ -0,0 +1,134 @@
+import gzip
+import io
+from bson import Binary
+from gridfs import GridFSBucket
+from gridfs.errors import FileExists, NoFile
+from pymongo.errors import DuplicateKeyError
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Raw filings are stored compressed in the "documents" collection.
+# Compressed payloads larger than INLINE_MAX_BYTES are written to GridFS (bucket GRIDFS_BUCKET) in chunks,
+# so there is no 16MB limit on the size of a filing.
+INLINE_MAX_BYTES = 8 * 1024 * 1024
+GRIDFS_BUCKET = "filings"
+DEFAULT_COMPRESSION = "zstd" if zstandard is not None else "gzip"
+
+
+def compress(data, compression=DEFAULT_COMPRESSION):
+    """
+    :param data: bytes to compress
+    :param compression: "zstd" or "gzip"
+    :return: compressed bytes
+    """
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard is not installed, use gzip compression")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"compression {compression} is not supported")
+
+
+def decompress_stream(stream, compression):
+    """
+    Wrap a binary stream of compressed data into a stream of decompressed data.
+    :param stream: binary file-like object
+    :param compression: "zstd", "gzip" or None
+    :return: binary file-like object
+    """
+    if compression is None:
+        return stream
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstandard is not installed, can't read zstd compressed filings")
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=stream, mode="rb")
+    raise ValueError(f"compression {compression} is not supported")
+
+
+def build_document(db, url, cik, form_type, filing_date, html, updated_at=None, compression=DEFAULT_COMPRESSION):
+    """
+    Build the "documents" collection entry of a filing.
+    The html is compressed and kept inline, or uploaded to GridFS if it is still too large once compressed.
+    :param db: MongoDB database
+    :param url: url of the filing, used as _id of the document and of the GridFS file
+    :param cik: company cik
+    :param form_type: form type of the filing
+    :param filing_date: filing date
+    :param html: content of the filing (str)
+    :param updated_at: last update
+    :param compression: "zstd" or "gzip"
+    :return: the document to insert in the "documents" collection
+    """
+    raw = html.encode("utf-8")
+    payload = compress(raw, compression)
+    doc = {"cik": cik, "form_type": form_type, "filing_date": filing_date, "updated_at": updated_at, "_id": url,
+           "compression": compression, "html_size": len(raw), "compressed_size": len(payload)}
+
+    if len(payload) <= INLINE_MAX_BYTES:
+        doc["html_compressed"] = Binary(payload)
+        return doc
+
+    bucket = GridFSBucket(db, bucket_name=GRIDFS_BUCKET)
+    try:
+        bucket.upload_from_stream_with_id(url, url, io.BytesIO(payload),
+                                          metadata={"cik": cik, "compression": compression})
+    except (FileExists, DuplicateKeyError):
+        # already uploaded by a previous run, the url of a filing is immutable
+        pass
+    doc["gridfs_id"] = url
+    return doc
+
+
+def discard_upload(db, doc, collection_name="documents"):
+    """
+    Delete the GridFS file uploaded by build_document when the document could not be written,
+    unless a document of the collection already points to it.
+    :param db: MongoDB database
+    :param doc: document returned by build_document
+    :param collection_name: collection of the documents
+    :return: True if the file was deleted
+    """
+    if "gridfs_id" not in doc or db[collection_name].count_documents({"gridfs_id": doc["gridfs_id"]}, limit=1) > 0:
+        return False
+    try:
+        GridFSBucket(db, bucket_name=GRIDFS_BUCKET).delete(doc["gridfs_id"])
+    except NoFile:
+        return False
+    return True
+
+
+def open_html(db, doc):
+    """
+    Open the html of a filing as a text stream, whatever the way it has been stored
+    (plain "html" field, compressed inline, or compressed in GridFS).
+    :param db: MongoDB database
+    :param doc: document from "documents" collection
+    :return: text file-like object
+    """
+    if "html" in doc:
+        return io.StringIO(doc["html"])
+    if "html_compressed" in doc:
+        stream = io.BytesIO(doc["html_compressed"])
+    elif "gridfs_id" in doc:
+        stream = GridFSBucket(db, bucket_name=GRIDFS_BUCKET).open_download_stream(doc["gridfs_id"])
+    else:
+        raise KeyError(f"document {doc['_id']} has no html")
+    return io.TextIOWrapper(decompress_stream(stream, doc.get("compression")), encoding="utf-8")
+
+
+def read_html(db, doc):
+    """
+    :param db: MongoDB database
+    :param doc: document from "documents" collection
+    :return: the html of the filing as a string
+    """
+    if "html" in doc:
+        return doc["html"]
+    with open_html(db, doc) as f:
+        return f.read()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Archive urls point to a specific accession number: their content never changes.
+PERMANENT_URL_PATTERNS = ("/Archives/edgar/data/",)
+# response headers kept in the cache
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Date")
+# default bound of the size of the bodies on disk, the least recently used ones are removed above it
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+# eviction removes bodies until the cache is below this fraction of max_size, so it does not run on every store
+EVICT_TARGET = 0.9
+
+
+class OfflineCacheMiss(Exception):
+    """
+    Raised in offline mode when a url is not in the cache.
+    """
+
+
+class HttpCache:
+    """
+    On-disk cache of HTTP responses.
+    Bodies are stored by content hash (objects/ab/abcdef...), so identical responses are saved once,
+    and each url has a small json metadata file (urls/<sha256 of url>.json) pointing to its body.
+    Archive urls are cached forever; other urls (index json files) are fresh for 'ttl' seconds and then
+    revalidated with If-None-Match / If-Modified-Since.
+    In offline mode responses are served only from the cache, without any request.
+    The bodies are bounded to 'max_size' bytes: above it the least recently used ones are removed (a body is
+    used when it is stored or served), with the metadata of their urls.
+    Can be shared by multiple threads.
+    """
+
+    def __init__(self, directory, ttl=3600, offline=False, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # size of the bodies on disk, computed on the first store
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evicted = 0
+
+    def _count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _url_path(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, "urls", key[:2], f"{key}.json")
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.directory, "objects", content_hash[:2], content_hash)
+
+    def _write_atomic(self, path, data):
+        # write in a temporary file and rename it, so concurrent processes never read a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def is_permanent(self, url):
+        return any(p in url for p in PERMANENT_URL_PATTERNS)
+
+    def load(self, url):
+        """
+        :param url: the url
+        :return: a tuple (metadata, body) or None if the url is not cached
+        """
+        try:
+            with open(self._url_path(url), "r") as f:
+                meta = json.load(f)
+            object_path = self._object_path(meta["content_hash"])
+            with open(object_path, "rb") as f:
+                body = f.read()
+            # the modification time of the body is its last use for the eviction
+            os.utime(object_path)
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+        return meta, body
+
+    def store(self, url, response):
+        """
+        Save a successful response in the cache.
+        :param url: the requested url
+        :param response: requests.Response
+        :return: metadata saved for the url
+        """
+        body = response.content
+        content_hash = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(content_hash)
+        if os.path.exists(object_path):
+            os.utime(object_path)
+        else:
+            self._write_atomic(object_path, body)
+            self._add_size(len(body))
+        meta = {
+            "url": url,
+            "content_hash": content_hash,
+            "encoding": response.encoding,
+            "headers": {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers},
+            "stored_at": time.time(),
+        }
+        self._write_atomic(self._url_path(url), json.dumps(meta).encode("utf-8"))
+        return meta
+
+    def _objects(self):
+        """
+        :return: list of tuples (last use, size, path) of the bodies on disk
+        """
+        objects = []
+        for root, _, files in os.walk(os.path.join(self.directory, "objects")):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                objects.append((st.st_mtime, st.st_size, path))
+        return objects
+
+    def _add_size(self, size):
+        if self.size is None:
+            # the body just written is already on disk
+            current = sum(s for _, s, _ in self._objects())
+            with self.lock:
+                self.size = current if self.size is None else self.size + size
+        else:
+            with self.lock:
+                self.size += size
+        if self.max_size is not None and self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used bodies until the cache is below EVICT_TARGET * max_size,
+        and the metadata of the urls pointing to them.
+        :return: number of bodies removed
+        """
+        if self.max_size is None:
+            return 0
+        objects = sorted(self._objects())
+        size = sum(s for _, s, _ in objects)
+        removed = set()
+        for _, object_size, path in objects:
+            if size <= self.max_size * EVICT_TARGET:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed.add(os.path.basename(path))
+            size -= object_size
+        if removed:
+            for root, _, files in os.walk(os.path.join(self.directory, "urls")):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        with open(path, "r") as f:
+                            content_hash = json.load(f).get("content_hash")
+                    except (FileNotFoundError, ValueError):
+                        continue
+                    if content_hash in removed:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+        with self.lock:
+            self.size = size
+            self.evicted += len(removed)
+        return len(removed)
+
+    def touch(self, url, meta):
+        meta["stored_at"] = time.time()
+        self._write_atomic(self._url_path(url), json.dumps(meta).encode("utf-8"))
+
+    def is_fresh(self, url, meta):
+        return self.is_permanent(url) or time.time() - meta["stored_at"] < self.ttl
+
+    def get(self, url, fetch):
+        """
+        Get the response for url from the cache, calling fetch only when needed.
+        :param url: the url
+        :param fetch: function fetch(url, headers) doing the actual request and returning a requests.Response
+        :return: requests.Response
+        """
+        cached = self.load(url)
+
+        if cached is not None:
+            meta, body = cached
+            if self.offline or self.is_fresh(url, meta):
+                self._count("hits")
+                return build_response(url, meta, body)
+        elif self.offline:
+            raise OfflineCacheMiss(url)
+
+        # conditional request if we have a stale copy
+        headers = {}
+        if cached is not None:
+            if "ETag" in meta["headers"]:
+                headers["If-None-Match"] = meta["headers"]["ETag"]
+            if "Last-Modified" in meta["headers"]:
+                headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+
+        response = fetch(url, headers)
+
+        if cached is not None and response.status_code == 304:
+            self._count("revalidated")
+            self.touch(url, meta)
+            return build_response(url, meta, body)
+
+        self._count("misses")
+        if response.status_code == 200:
+            self.store(url, response)
+        return response
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated,
+                    "evicted": self.evicted}
+
+
+def build_response(url, meta, body):
+    """
+    Rebuild a requests.Response from cached data.
+    """
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.encoding = meta["encoding"]
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    return response
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import re
+import zlib
+import rapidfuzz
+import llm_models as llm_models
+
+# Year over year summaries: the paragraphs of a section are aligned with the same section of the previous
+# filing of the company (same form type). Only the added and changed paragraphs are sent to the model,
+# with the previous summary, to get the updated summary and what changed.
+
+# lines shorter than this are joined to the next one (titles, table cells)
+MIN_PARAGRAPH_LENGTH = 80
+# longer lines (the section text stored by mongodb.extract_sections has no line breaks) are cut in groups of sentences, at the end of the sentences whose hash
+# is a multiple of SENTENCE_GROUP, so that a sentence added or removed doesn't move the other cuts
+MAX_PARAGRAPH_LENGTH = 2000
+SENTENCE_GROUP = 4
+# sentences longer than MAX_PARAGRAPH_LENGTH are cut the same way, after the pairs of words whose hash is a
+# multiple of WORD_GROUP
+WORD_GROUP = 64
+# a paragraph matching a previous one with a score >= UNCHANGED_SCORE and the same figures is unchanged
+# (punctuation, a few words), with a score >= CHANGED_SCORE it is a changed version of the previous one,
+# otherwise it is new. On paragraphs of up to MAX_PARAGRAPH_LENGTH characters 98 allows ~40 edited characters.
+UNCHANGED_SCORE = 98
+CHANGED_SCORE = 60
+# the section is summarized from scratch when more than this share of its tokens changed
+MAX_CHANGED_SHARE = 0.5
+# removed paragraphs are sent to the model truncated to this many characters
+REMOVED_PARAGRAPH_CHARACTERS = 300
+# chain_type of the incremental summaries in summary_cache
+INCREMENTAL_CHAIN_TYPE = "incremental"
+
+WHITESPACE = re.compile(r"\s+")
+FIGURE = re.compile(r"\d[\d,.]*")
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[A-Z(\"])")
+
+INCREMENTAL_PROMPT = """Here is the summary of a section of last year's SEC filing of a company:
+\"\"\"
+{previous_summary}
+\"\"\"
+
+This year the following paragraphs of the section were added or changed:
+\"\"\"
+{changed}
+\"\"\"
+
+and the following paragraphs were removed:
+\"\"\"
+{removed}
+\"\"\"
+
+Update the summary for this year, and describe what changed.
+Return only a JSON object like {{"summary": "updated summary", "changes": "what changed since last year"}}.
+JSON:"""
+
+
+def split_long_sentence(sentence):
+    """
+    :param sentence: a sentence longer than MAX_PARAGRAPH_LENGTH
+    :return: list of pieces of the sentence, cut where the content says so (see WORD_GROUP)
+    """
+    pieces = []
+    piece = []
+    length = 0
+    previous = ""
+    for word in sentence.split(" "):
+        piece.append(word)
+        length += len(word) + 1
+        if length >= MAX_PARAGRAPH_LENGTH or zlib.crc32(f"{previous} {word}".encode("utf-8")) % WORD_GROUP == 0:
+            pieces.append(" ".join(piece))
+            piece = []
+            length = 0
+        previous = word
+    if piece:
+        pieces.append(" ".join(piece))
+    return pieces
+
+
+def split_long_paragraph(paragraph):
+    """
+    :param paragraph: a paragraph longer than MAX_PARAGRAPH_LENGTH
+    :return: list of groups of sentences, cut where the content says so (see SENTENCE_GROUP)
+    """
+    groups = []
+    group = []
+    length = 0
+    for sentence in SENTENCE_END.split(paragraph):
+        if len(sentence) > MAX_PARAGRAPH_LENGTH:
+            if group:
+                groups.append(" ".join(group))
+                group = []
+                length = 0
+            groups += split_long_sentence(sentence)
+            continue
+        group.append(sentence)
+        length += len(sentence) + 1
+        if length >= MAX_PARAGRAPH_LENGTH or zlib.crc32(sentence.encode("utf-8")) % SENTENCE_GROUP == 0:
+            groups.append(" ".join(group))
+            group = []
+            length = 0
+    if group:
+        groups.append(" ".join(group))
+    return groups
+
+
+def split_paragraphs(text):
+    """
+    :param text: section text, see mongodb.get_sections_text_with_hrefs
+    :return: list of paragraphs, whitespace normalized
+    """
+    paragraphs = []
+    pending = ""
+    for line in text.split("\n"):
+        line = WHITESPACE.sub(" ", line).strip()
+        if not line:
+            continue
+        pending = f"{pending} {line}" if pending else line
+        if len(pending) >= MIN_PARAGRAPH_LENGTH:
+            if len(pending) > MAX_PARAGRAPH_LENGTH:
+                paragraphs += split_long_paragraph(pending)
+            else:
+                paragraphs.append(pending)
+            pending = ""
+    if pending:
+        paragraphs.append(pending)
+    return paragraphs
+
+
+def paragraph_hash(paragraph):
+    return hashlib.sha1(paragraph.lower().encode("utf-8")).hexdigest()
+
+
+def same_figures(paragraph, other):
+    """
+    :return: True if the two paragraphs contain the same numbers (amounts, dates, percentages), in the same order
+    """
+    return FIGURE.findall(paragraph) == FIGURE.findall(other)
+
+
+def align_paragraphs(previous, current):
+    """
+    Align the paragraphs of the current section with the ones of the previous filing.
+    Identical paragraphs are matched by hash, the others with the best fuzzy match (each previous paragraph is
+    matched once).
+    :param previous: list of paragraphs of the previous filing
+    :param current: list of paragraphs of the current filing
+    :return: dictionary with the lists of "unchanged", "changed" (tuples (previous, current)), "added" and
+     "removed" paragraphs
+    """
+    previous_hashes = {}
+    for i, paragraph in enumerate(previous):
+        previous_hashes.setdefault(paragraph_hash(paragraph), []).append(i)
+
+    matched = set()
+    unmatched = []
+    diff = {"unchanged": [], "changed": [], "added": [], "removed": []}
+    for paragraph in current:
+        candidates = previous_hashes.get(paragraph_hash(paragraph))
+        if candidates:
+            matched.add(candidates.pop())
+            diff["unchanged"].append(paragraph)
+        else:
+            unmatched.append(paragraph)
+
+    left = [i for i in range(len(previous)) if i not in matched]
+    if unmatched and left:
+        scores = rapidfuzz.process.cdist(unmatched, [previous[i] for i in left], scorer=rapidfuzz.fuzz.ratio,
+                                         processor=str.lower, score_cutoff=CHANGED_SCORE)
+        # best pairs first, so a previous paragraph goes to its closest current version
+        pairs = sorted(((scores[r, c], r, c) for r, c in zip(*scores.nonzero())), reverse=True)
+        used_rows, used_columns = set(), set()
+        for score, r, c in pairs:
+            if r in used_rows or c in used_columns:
+                continue
+            used_rows.add(r)
+            used_columns.add(c)
+            matched.add(left[c])
+            if score >= UNCHANGED_SCORE and same_figures(previous[left[c]], unmatched[r]):
+                diff["unchanged"].append(unmatched[r])
+            else:
+                diff["changed"].append((previous[left[c]], unmatched[r]))
+        diff["added"] = [p for r, p in enumerate(unmatched) if r not in used_rows]
+    else:
+        diff["added"] = unmatched
+
+    diff["removed"] = [p for i, p in enumerate(previous) if i not in matched]
+    return diff
+
+
+def changed_share(diff, model="gpt-3.5-turbo"):
+    """
+    :return: share of the tokens of the current section in changed and added paragraphs
+    """
+    changed = sum(llm_models.count_tokens(p, model) for p in diff["added"] + [c for _, c in diff["changed"]])
+    total = changed + sum(llm_models.count_tokens(p, model) for p in diff["unchanged"])
+    return changed / total if total else 0
+
+
+def build_incremental_prompt(previous_summary, diff):
+    """
+    :param previous_summary: bullet points of the summary of the previous filing
+    :param diff: result of align_paragraphs
+    :return: the prompt, None if nothing changed
+    """
+    changed = diff["added"] + [c for _, c in diff["changed"]]
+    if not changed and not diff["removed"]:
+        return None
+    removed = [p[:REMOVED_PARAGRAPH_CHARACTERS] for p in diff["removed"]]
+    return INCREMENTAL_PROMPT.format(previous_summary=". ".join(previous_summary),
+                                     changed="\n\n".join(changed) or "(none)",
+                                     removed="\n\n".join(removed) or "(none)")
+
+
+def parse_incremental_response(response):
+    """
+    :param response: text returned by the model
+    :return: a tuple (updated summary, changes), None if the answer is not a valid JSON object
+    """
+    start, end = response.find("{"), response.rfind("}")
+    try:
+        answer = json.loads(response[start:end + 1])
+        summary, changes = answer["summary"], answer.get("changes", "")
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+    return summary.strip(), changes.strip() if isinstance(changes, str) else ""
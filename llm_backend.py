@@ -0,0 +1,240 @@
+from abc import ABC, abstractmethod
+import json
+import re
+import threading
+import time
+import llm_models as llm_models
+
+# Backends answering the calls of analyzer.create_summary and analyzer.create_completion.
+# The chat model clients and the summarize chains are created once per model / (model, chain_type) and reused
+# by all the calls, so HTTP connections are kept open between sections.
+#     llm_backend.set_llm_backend(llm_backend.FakeBackend(latency=0.2))   # offline, no API key needed
+# FakeBackend answers deterministically from the prompt, with the token counts of llm_models.estimate_usage:
+# summaries, their cost and the throughput of analyzer.sections_summary can be checked without calling OpenAI.
+
+# sentences of the text used as summary by FakeBackend
+FAKE_SUMMARY_SENTENCES = 3
+
+PACKED_SECTION_PATTERN = re.compile(r'^Section (\d+): [^\n]*\n"""\n(.*?)\n"""', re.DOTALL | re.MULTILINE)
+QUOTED_PATTERN = re.compile(r'"""\n(.*?)\n"""', re.DOTALL)
+
+
+def fake_summary(text):
+    """
+    :param text: a string
+    :return: the first FAKE_SUMMARY_SENTENCES sentences of text
+    """
+    return ". ".join(s.strip() for s in text.split(". ")[:FAKE_SUMMARY_SENTENCES]).strip()
+
+
+def fake_completion(prompt):
+    """
+    Answer of FakeBackend to a prompt: the JSON object asked by the packed (section_packing) and incremental
+    (incremental_summary) prompts, otherwise the summary of the prompt.
+    :param prompt: the prompt
+    :return: the answer
+    """
+    sections = PACKED_SECTION_PATTERN.findall(prompt)
+    if sections:
+        return json.dumps({number: fake_summary(text) for number, text in sections})
+    if '"changes"' in prompt:
+        quoted = QUOTED_PATTERN.findall(prompt)
+        changed = quoted[1] if len(quoted) > 1 else ""
+        return json.dumps({"summary": fake_summary(quoted[0] if quoted else prompt),
+                           "changes": fake_summary(changed)})
+    return fake_summary(prompt)
+
+
+class LLMBackend(ABC):
+    """
+    Pools of clients (one per model) and summarize chains (one per model and chain_type), shared by threads.
+    Subclasses implement create_client, create_chain, summarize and complete.
+    With pooled=False a new client and chain are created for every call (the behaviour before the pools).
+    'name' identifies the backend in the summary cache, so summaries of different backends are never mixed.
+    """
+    name = None
+
+    def __init__(self, pooled=True):
+        self.pooled = pooled
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.chains = {}
+        self.key_locks = {}
+        self.created = {"clients": 0, "chains": 0}
+
+    def _get(self, pool, kind, key, create):
+        if not self.pooled:
+            with self.lock:
+                self.created[kind] += 1
+            return create()
+        with self.lock:
+            if key in pool:
+                return pool[key]
+            key_lock = self.key_locks.setdefault((kind, key), threading.Lock())
+        # created once, the other threads wait for it without blocking the other keys
+        with key_lock:
+            with self.lock:
+                if key in pool:
+                    return pool[key]
+            value = create()
+            with self.lock:
+                self.created[kind] += 1
+                pool[key] = value
+            return value
+
+    def client(self, model, verbose=False):
+        return self._get(self.clients, "clients", (model, verbose), lambda: self.create_client(model, verbose))
+
+    def chain(self, model, chain_type, verbose=False):
+        return self._get(self.chains, "chains", (model, chain_type, verbose),
+                         lambda: self.create_chain(model, chain_type, verbose))
+
+    @abstractmethod
+    def create_client(self, model, verbose):
+        """
+        :return: a new client of the model
+        """
+
+    @abstractmethod
+    def create_chain(self, model, chain_type, verbose):
+        """
+        :return: a new summarize chain of the model
+        """
+
+    @abstractmethod
+    def summarize(self, text, model, chain_type, verbose=False):
+        """
+        :return: the summary of text, the number of total tokens it took and its cost
+        """
+
+    @abstractmethod
+    def complete(self, prompt, model, verbose=False):
+        """
+        :return: the answer to prompt, the number of total tokens it took and its cost
+        """
+
+    def stats(self):
+        with self.lock:
+            return dict(self.created)
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    langchain ChatOpenAI clients and load_summarize_chain chains, the API key is read from credentials.cfg
+    (see analyzer.get_openai_api_key) when the first client is created.
+    """
+    name = "openai"
+
+    def __init__(self, api_key=None, pooled=True):
+        super().__init__(pooled)
+        self.api_key = api_key
+
+    def create_client(self, model, verbose):
+        from langchain.chat_models import ChatOpenAI
+        import analyzer as analyzer
+
+        return ChatOpenAI(model_name=model, openai_api_key=self.api_key or analyzer.get_openai_api_key(),
+                          verbose=verbose)
+
+    def create_chain(self, model, chain_type, verbose):
+        from langchain.chains.summarize import load_summarize_chain
+
+        return load_summarize_chain(self.client(model, verbose), chain_type=chain_type, verbose=verbose)
+
+    def summarize(self, text, model, chain_type, verbose=False):
+        from langchain.callbacks import get_openai_callback
+        import analyzer as analyzer
+
+        # split text in chunks fitting in the context of the model
+        docs = analyzer.split_doc_in_chunks(analyzer.text_documents(text), model=model)
+        chain = self.chain(model, chain_type, verbose)
+
+        # the callback counts the tokens of the calls of this thread only
+        with get_openai_callback() as cb:
+            res = chain.run(docs)
+        return res, cb.total_tokens, llm_models.compute_cost(cb.prompt_tokens, model, cb.completion_tokens)
+
+    def complete(self, prompt, model, verbose=False):
+        from langchain.callbacks import get_openai_callback
+
+        with get_openai_callback() as cb:
+            response = self.client(model, verbose).invoke(prompt).content
+        return response, cb.total_tokens, llm_models.compute_cost(cb.prompt_tokens, model, cb.completion_tokens)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Local deterministic model: the answers depend only on the prompt (see fake_summary and fake_completion).
+    A summary uses the calls and tokens estimated by llm_models.estimate_usage, a completion the tokens of the
+    prompt and of the answer. Each call sleeps 'latency' seconds plus 'seconds_per_1k_tokens' per 1000 tokens,
+    creating a client sleeps 'connect_latency' seconds (connection and TLS handshake).
+    The calls, tokens and cost of all the calls are counted in 'usage'.
+    """
+    name = "fake"
+
+    def __init__(self, latency=0.2, seconds_per_1k_tokens=0.01, connect_latency=0.1, pooled=True):
+        super().__init__(pooled)
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.connect_latency = connect_latency
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0}
+
+    def create_client(self, model, verbose):
+        time.sleep(self.connect_latency)
+        return model
+
+    def create_chain(self, model, chain_type, verbose):
+        return self.client(model, verbose), chain_type
+
+    def _call(self, model, calls, prompt_tokens, completion_tokens):
+        time.sleep(self.latency * calls + self.seconds_per_1k_tokens * (prompt_tokens + completion_tokens) / 1000)
+        cost = llm_models.compute_cost(prompt_tokens, model, completion_tokens)
+        with self.lock:
+            self.usage["calls"] += calls
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+            self.usage["cost"] = round(self.usage["cost"] + cost, 6)
+        return prompt_tokens + completion_tokens, cost
+
+    def summarize(self, text, model, chain_type, verbose=False):
+        self.chain(model, chain_type, verbose)
+        calls, prompt_tokens, completion_tokens = llm_models.estimate_usage(
+            llm_models.count_tokens(text, model), model, chain_type)
+        tokens, cost = self._call(model, calls, prompt_tokens, completion_tokens)
+        return fake_summary(text), tokens, cost
+
+    def complete(self, prompt, model, verbose=False):
+        self.client(model, verbose)
+        response = fake_completion(prompt)
+        tokens, cost = self._call(model, 1, llm_models.count_tokens(prompt, model),
+                                  llm_models.count_tokens(response, model))
+        return response, tokens, cost
+
+    def stats(self):
+        with self.lock:
+            return dict(self.created, **self.usage)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_llm_backend():
+    """
+    Get the backend used by analyzer, an OpenAIBackend created on first use unless set_llm_backend was called.
+    :return: LLMBackend
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = OpenAIBackend()
+        return _backend
+
+
+def set_llm_backend(backend):
+    """
+    :param backend: LLMBackend used by analyzer from now on, e.g. FakeBackend() to run offline
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,112 @@
+import functools
+import math
+
+# Context window (tokens) and price in USD per 1000 prompt / completion tokens of the OpenAI models.
+MODELS = {
+    "gpt-3.5-turbo": {"context": 4096, "prompt_price": 0.0015, "completion_price": 0.002, "encoding": "cl100k_base"},
+    "gpt-3.5-turbo-16k": {"context": 16385, "prompt_price": 0.003, "completion_price": 0.004, "encoding": "cl100k_base"},
+    "gpt-3.5-turbo-0125": {"context": 16385, "prompt_price": 0.0005, "completion_price": 0.0015, "encoding": "cl100k_base"},
+    "gpt-4o-mini": {"context": 128000, "prompt_price": 0.00015, "completion_price": 0.0006, "encoding": "o200k_base"},
+    "gpt-4o": {"context": 128000, "prompt_price": 0.0025, "completion_price": 0.01, "encoding": "o200k_base"},
+}
+# models analyzer.sections_summary chooses from
+SUMMARY_MODELS = ("gpt-3.5-turbo", "gpt-3.5-turbo-16k")
+# sections always summarized with a refine chain when they don't fit in one call
+REFINE_SECTIONS = ("business", "risk", "MD&A")
+
+# tokens of the summarize prompt templates, and tokens reserved for the answer of each call.
+# A refine call sends the previous answer with the chunk, so a chunk is at most context - template - 2 answers.
+PROMPT_TEMPLATE_TOKENS = 200
+ANSWER_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 25
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """
+    :param model: model name, models missing from MODELS use cl100k_base
+    :return: tiktoken encoding of the model
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding(MODELS[model]["encoding"] if model in MODELS else "cl100k_base")
+
+
+# sections are counted again by the scheduler and the summary of the same document
+@functools.lru_cache(maxsize=32)
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    :param text: a string
+    :param model: model name
+    :return: number of tokens of text for the model
+    """
+    return len(get_encoding(model).encode(text, disallowed_special=()))
+
+
+def chunk_size(model):
+    """
+    :param model: model name
+    :return: maximum number of tokens of a chunk of text sent to the model by a summarize chain
+    """
+    return MODELS[model]["context"] - PROMPT_TEMPLATE_TOKENS - 2 * ANSWER_TOKENS
+
+
+def compute_cost(prompt_tokens, model="gpt-3.5-turbo", completion_tokens=0):
+    """
+    Compute API cost from number of tokens
+    :param prompt_tokens: the number of tokens sent to the model
+    :param model: the model name, one of MODELS
+    :param completion_tokens: the number of tokens of the answers
+    :return: cost in USD
+    """
+    if model not in MODELS:
+        raise ValueError(f"model {model} is not in llm_models.MODELS, its price is unknown")
+    prices = MODELS[model]
+    return round((prompt_tokens * prices["prompt_price"] + completion_tokens * prices["completion_price"]) / 1000, 6)
+
+
+def estimate_usage(tokens, model, chain_type):
+    """
+    Estimate the usage of a summarize chain on a text.
+    :param tokens: number of tokens of the text
+    :param model: model name
+    :param chain_type: "stuff", "map_reduce" or "refine"
+    :return: a tuple (number of calls, prompt tokens, completion tokens)
+    """
+    chunks = max(1, math.ceil(tokens / chunk_size(model)))
+    if chain_type == "map_reduce" and chunks > 1:
+        # the answers of the chunks are combined with a last call
+        calls = chunks + 1
+        prompt_tokens = tokens + calls * PROMPT_TEMPLATE_TOKENS + chunks * ANSWER_TOKENS
+    elif chain_type == "refine":
+        calls = chunks
+        prompt_tokens = tokens + calls * PROMPT_TEMPLATE_TOKENS + (chunks - 1) * ANSWER_TOKENS
+    else:
+        calls = 1
+        prompt_tokens = tokens + PROMPT_TEMPLATE_TOKENS
+    return calls, prompt_tokens, calls * ANSWER_TOKENS
+
+
+def plan_summary(section_title, tokens, models=SUMMARY_MODELS):
+    """
+    Choose the model and the chain type summarizing a section with the fewest LLM calls, then at the lowest cost.
+    A section fitting in one chunk is summarized in a single call ("stuff"); a longer one is split in chunks
+    of chunk_size(model) tokens and summarized with "refine" (REFINE_SECTIONS) or "map_reduce".
+    :param section_title: title returned by analyzer.restructure_document
+    :param tokens: number of tokens of the section text
+    :param models: models to choose from
+    :return: a tuple (model, chain_type)
+    """
+    best = None
+    for model in models:
+        if tokens <= chunk_size(model):
+            chain_type = "stuff"
+        elif section_title in REFINE_SECTIONS:
+            chain_type = "refine"
+        else:
+            chain_type = "map_reduce"
+        calls, prompt_tokens, completion_tokens = estimate_usage(tokens, model, chain_type)
+        key = (calls, compute_cost(prompt_tokens, model, completion_tokens))
+        if best is None or key < best[0]:
+            best = (key, model, chain_type)
+    return best[1], best[2]
@@ -0,0 +1,121 @@
+import json
+import re
+import llm_models as llm_models
+
+# Short sections (many 8-K items, "unresolved", "property", ... of 10-K and 10-Q) are summarized together:
+# several sections go in one prompt asking for a JSON object with one summary per section, and the answer
+# is split back into the summaries of the sections.
+
+# sections of at most PACK_MAX_SECTION_TOKENS tokens are packed, at most PACK_MAX_SECTIONS per prompt
+PACK_MAX_SECTION_TOKENS = 1500
+PACK_MAX_SECTIONS = 20
+# tokens of the header of a section in the prompt, and tokens reserved for its summary in the answer
+PACKED_SECTION_HEADER_TOKENS = 20
+PACKED_ANSWER_TOKENS = 150
+# chain_type of the packed summaries in summary_cache
+PACKED_CHAIN_TYPE = "packed"
+
+PACKED_PROMPT = """Write a concise summary of each of the following sections of SEC filings.
+Return only a JSON object mapping the number of each section to its summary, like {{"1": "summary of section 1", "2": "summary of section 2"}}.
+
+{sections}
+JSON:"""
+PACKED_SECTION = '''Section {number}: {title}
+"""
+{text}
+"""
+'''
+JSON_MEMBER = re.compile(r'"(\d+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def section_pack_tokens(tokens):
+    """
+    :param tokens: number of tokens of the text of a section
+    :return: tokens used by the section in a packed prompt, answer included
+    """
+    return tokens + PACKED_SECTION_HEADER_TOKENS + PACKED_ANSWER_TOKENS
+
+
+def pack_sections(sections, model):
+    """
+    Group sections in as few prompts as possible for the model (first fit decreasing).
+    :param sections: list of tuples (key, title, text, tokens), with tokens <= PACK_MAX_SECTION_TOKENS
+    :param model: model name
+    :return: list of packs, each a list of sections
+    """
+    capacity = llm_models.MODELS[model]["context"] - llm_models.PROMPT_TEMPLATE_TOKENS
+    packs = []
+    free = []
+    for section in sorted(sections, key=lambda s: s[3], reverse=True):
+        size = section_pack_tokens(section[3])
+        for i, pack in enumerate(packs):
+            if free[i] >= size and len(pack) < PACK_MAX_SECTIONS:
+                pack.append(section)
+                free[i] -= size
+                break
+        else:
+            packs.append([section])
+            free.append(capacity - size)
+    return packs
+
+
+def plan_packs(sections, models=llm_models.SUMMARY_MODELS):
+    """
+    Choose the model packing the sections in the fewest prompts, then at the lowest estimated cost.
+    :param sections: list of tuples (key, title, text, tokens)
+    :param models: models to choose from
+    :return: a tuple (model, packs)
+    """
+    best = None
+    for model in models:
+        packs = pack_sections(sections, model)
+        prompt_tokens = sum(llm_models.PROMPT_TEMPLATE_TOKENS + sum(s[3] + PACKED_SECTION_HEADER_TOKENS for s in pack)
+                            for pack in packs)
+        cost = llm_models.compute_cost(prompt_tokens, model, len(sections) * PACKED_ANSWER_TOKENS)
+        if best is None or (len(packs), cost) < best[0]:
+            best = ((len(packs), cost), model, packs)
+    return best[1], best[2]
+
+
+def build_packed_prompt(pack):
+    """
+    :param pack: list of tuples (key, title, text, tokens)
+    :return: the prompt, sections are numbered from 1 in the order of pack
+    """
+    sections = "\n".join(PACKED_SECTION.format(number=i, title=title, text=text)
+                         for i, (_, title, text, _) in enumerate(pack, start=1))
+    return PACKED_PROMPT.format(sections=sections)
+
+
+def parse_packed_response(response, pack):
+    """
+    Split the answer to a packed prompt in the summaries of the sections.
+    :param response: text returned by the model
+    :param pack: the list of sections of the prompt
+    :return: dictionary section key -> summary, sections missing from the answer are not in the dictionary
+    """
+    summaries = {}
+    start = response.find("{")
+    if start >= 0:
+        end = response.rfind("}")
+        answer = response[start:end + 1] if end > start else response[start:]
+        try:
+            summaries = {str(k): v for k, v in json.loads(answer).items()}
+        except (ValueError, AttributeError):
+            # truncated or invalid json, keep the members that are complete
+            summaries = {}
+            for k, v in JSON_MEMBER.findall(answer):
+                try:
+                    summaries[k] = json.loads(f'"{v}"')
+                except ValueError:
+                    # invalid escape (e.g. \$) or control character, the section is summarized alone
+                    continue
+
+    result = {}
+    for i, (key, _, _, _) in enumerate(pack, start=1):
+        summary = summaries.get(str(i))
+        if isinstance(summary, list):
+            summary = " ".join(str(s) for s in summary)
+        if isinstance(summary, str) and summary.strip():
+            result[key] = summary.strip()
+    return result
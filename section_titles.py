@@ -0,0 +1,126 @@
+import functools
+import re
+import string
+
+# Normalization and classification of section titles, shared by the parsing (mongodb.py) and the
+# summarization (analyzer.py). Titles repeat a lot between filings: results are memoized.
+
+# "12.", "1a.", ... are removed in this order, so "12." is removed before "2." can match inside it
+NUMBER_SUFFIXES = tuple(f"{idx}{let}." for idx in range(20, 0, -1) for let in ['', 'a', 'b', 'c'])
+PAGE_NUMBERS = tuple(f"f-{idx}" for idx in range(10, 0, -1))
+# a title contains one of NUMBER_SUFFIXES / PAGE_NUMBERS only if it matches these
+ANY_NUMBER_SUFFIX = re.compile(r"\d[abc]?\.")
+ANY_PAGE_NUMBER = re.compile(r"f-\d")
+PARENTHESES = re.compile(r'\([^)]*\)')
+TITLE_STRIP_CHARACTERS = string.punctuation + string.whitespace
+
+# Rules used to assign a section of a parsed document to a category, by form type.
+# The first rule matching a title (lower case) wins. A rule matches if the title contains
+# all the "all" strings, at least one of the "any" strings, and none of the "none" strings.
+SECTION_TITLE_RULES = {
+    "10-K": [
+        ("business", {"any": ["business", "overview", "company", "general", "outlook"], "none": ["combination"]}),
+        ("property", {"all": ["propert"], "none": ["plant", "business"]}),
+        ("foreign", {"all": ["foreign", "jurisdiction"]}),
+        ("legal", {"all": ["legal", "proceeding"]}),
+        ("other", {"all": ["information", "other"]}),
+        ("unresolved", {"all": ["unresolved"]}),
+        ("risk", {"all": ["risk"]}),
+        # we are not going to summarize MD&A and financial notes sections of the document, while both extremely
+        # important, because we didn't manage to obtain useful results from OpenAI models, without further
+        # pre-processing.
+        # ("MD&A", {"all": ["management", "discussion"]}),
+        # ("notes", {"any": ["supplementa"]}), ("notes", {"all": ["note"], "none": ["statement"]}),
+    ],
+    "10-Q": [
+        ("legal", {"all": ["legal", "proceeding"]}),
+        ("MD&A", {"all": ["management", "discussion"]}),
+        ("other", {"all": ["information", "other"]}),
+        ("risk", {"all": ["risk"]}),
+        ("equity", {"all": ["sales", "equity"]}),
+        ("defaults", {"all": ["default"]}),
+    ],
+    "8-K": [
+        ("exhibits", {"all": ["financial statements and exhibits"]}),
+    ],
+}
+SECTION_TITLE_RULES["10-K/A"] = SECTION_TITLE_RULES["10-K"]
+SECTION_TITLE_RULES["10-Q/A"] = SECTION_TITLE_RULES["10-Q"]
+
+
+def compile_rule(rule):
+    """
+    Compile a rule of SECTION_TITLE_RULES in a single regular expression made of lookaheads.
+    :param rule: dictionary with the optional "all", "any" and "none" lists of strings
+    :return: compiled pattern, to be matched at the start of a lower case title
+    """
+    pattern = "".join(f"(?=.*{re.escape(s)})" for s in rule.get("all", []))
+    if rule.get("any"):
+        pattern += "(?=.*(?:" + "|".join(re.escape(s) for s in rule["any"]) + "))"
+    pattern += "".join(f"(?!.*{re.escape(s)})" for s in rule.get("none", []))
+    return re.compile(pattern, re.DOTALL)
+
+
+COMPILED_SECTION_TITLE_RULES = {form_type: [(category, compile_rule(rule)) for category, rule in rules]
+                                for form_type, rules in SECTION_TITLE_RULES.items()}
+
+
+@functools.lru_cache(maxsize=65536)
+def clean_section_title(title):
+    """
+    Clean the title string removing special words and punctuation that makes harder to recognize it.
+    :param title: a string
+    :return: a cleaned string, lowercase
+    """
+    # lower case, remove special html characters and "item "
+    title = title.lower()
+    if not title.isascii():
+        from unidecode import unidecode
+
+        title = unidecode(title)
+    title = title.replace("item ", "")
+
+    # remove '1.' etc
+    if ANY_NUMBER_SUFFIX.search(title):
+        for suffix in NUMBER_SUFFIXES:
+            title = title.replace(suffix, "")
+    if ANY_PAGE_NUMBER.search(title):
+        for page in PAGE_NUMBERS:
+            title = title.replace(page, "")
+
+    # remove parentesis and strip
+    return PARENTHESES.sub('', title).strip(TITLE_STRIP_CHARACTERS)
+
+
+@functools.lru_cache(maxsize=65536)
+def classify_section_title(form_type, title):
+    """
+    Find the category of a section of a parsed document, see SECTION_TITLE_RULES.
+    :param form_type: form type of the document
+    :param title: section title, as found in parsed_documents
+    :return: the category, or None if no rule matches the title or there are no rules for the form type
+    """
+    title = title.lower()
+    for category, pattern in COMPILED_SECTION_TITLE_RULES.get(form_type, []):
+        if pattern.match(title):
+            return category
+    return None
+
+
+def classify_section_titles(form_type, titles):
+    """
+    :param form_type: form type of the documents
+    :param titles: iterable of section titles
+    :return: dictionary title -> category or None, in the order of titles
+    """
+    return {title: classify_section_title(form_type, title) for title in titles}
+
+
+def classify_documents(docs, form_type=None):
+    """
+    Classify the sections of many parsed documents at once: each distinct title is classified once.
+    :param docs: iterable of parsed_documents entries, with their "_id", "form_type" and "sections"
+    :param form_type: rules to use for every document, default the form type of each document
+    :return: dictionary document id -> {section title: category or None}
+    """
+    return {doc["_id"]: classify_section_titles(form_type or doc["form_type"], doc["sections"]) for doc in docs}
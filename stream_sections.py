@@ -0,0 +1,629 @@
+import copy
+import re
+from html.parser import HTMLParser
+from bs4.builder import HTMLTreeBuilder
+from bs4.dammit import EntitySubstitution
+import mongodb as mongodb
+
+# Event driven version of mongodb.extract_sections: the html is tokenized with html.parser, like the default
+# BeautifulSoup backend, but no tree is built and the body text is never materialized as a single string.
+# The html is read once to find the table of contents and the anchors, and once more to emit the text of the
+# sections one at a time (the string fallback needs one more pass to find the sections headings), so the memory
+# used is proportional to the largest section and to the table of contents, not to the document.
+# The open elements stack of the BeautifulSoup html.parser tree builder is rebuilt from the events
+# (void elements, unclosed tags, whitespace only strings, comments/scripts/styles...), so the sections found
+# and their text are the same of the "html.parser" backend.
+
+CHUNK_SIZE = 64 * 1024
+
+# void elements of the BeautifulSoup html builders (HTMLTreeBuilder.empty_element_tags in bs4 4.12,
+# DEFAULT_EMPTY_ELEMENT_TAGS in later versions)
+VOID_ELEMENTS = frozenset(("area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr",
+                           "image", "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid",
+                           "param", "source", "spacer", "track", "wbr"))
+PRESERVE_WHITESPACE_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS)
+# strings inside these elements are not text (Script, Stylesheet... in BeautifulSoup)
+STRING_CONTAINER_ELEMENTS = frozenset(HTMLTreeBuilder.DEFAULT_STRING_CONTAINERS)
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+MULTIPLE_SPACES = re.compile(" +")
+ITEM = re.compile("item", re.IGNORECASE)
+
+
+class EventParser(HTMLParser):
+    """
+    html.parser tokenizer calling a handler with the elements and strings BeautifulSoup would create:
+        handler.start(name, attrs, ordinal, depth, in_body): an element starts, ordinal is its position in
+            document order (like DocumentIndex.position) and depth the number of open elements around it
+        handler.end(name, depth): the element started at that depth ends
+        handler.string(text, is_text, depth, in_body, container_depth): a string, is_text is False for comments,
+            scripts, styles, declarations... whose .text is empty. container_depth is the depth of the <script>,
+            <style>... element containing the string (Script, Stylesheet... in BeautifulSoup), otherwise None
+    in_body is True for the descendants of the first <body> element (soup.body).
+    """
+
+    def __init__(self, handler):
+        super().__init__(convert_charrefs=False)
+        self.handler = handler
+        self.stack = []
+        self.open_elements = {}
+        self.preserve_whitespace = 0
+        # depth of the open <script>, <style>... elements
+        self.container_depths = []
+        self.already_closed = []
+        self.data = []
+        self.ordinal = 0
+        self.body_found = False
+        # len(self.stack) when the body element is open
+        self.body_depth = None
+
+    def handle_starttag(self, tag, attrs, handle_void_element=True):
+        self.end_data()
+        # duplicated attributes: the last value is kept, None values are empty strings
+        attributes = {}
+        for key, value in attrs:
+            attributes[key] = "" if value is None else value
+        depth = len(self.stack)
+        self.handler.start(tag, attributes, self.ordinal, depth, self.body_depth is not None)
+        self.ordinal += 1
+
+        self.stack.append(tag)
+        self.open_elements[tag] = self.open_elements.get(tag, 0) + 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserve_whitespace += 1
+        if tag in STRING_CONTAINER_ELEMENTS:
+            self.container_depths.append(depth)
+        if tag == "body" and not self.body_found:
+            self.body_found = True
+            self.body_depth = len(self.stack)
+
+        if handle_void_element and tag in VOID_ELEMENTS:
+            # no end tag is expected, an explicit one is ignored
+            self.handle_endtag(tag, check_already_closed=False)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, handle_void_element=False)
+        self.handle_endtag(tag, check_already_closed=False)
+
+    def handle_endtag(self, tag, check_already_closed=True):
+        if check_already_closed and tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        self.end_data()
+        # close the most recent element with that name, and every element opened inside it.
+        # An end tag without a matching open element is ignored
+        if not self.open_elements.get(tag):
+            return
+        while self.pop() != tag:
+            pass
+
+    def pop(self):
+        tag = self.stack.pop()
+        self.open_elements[tag] -= 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserve_whitespace -= 1
+        if tag in STRING_CONTAINER_ELEMENTS:
+            self.container_depths.pop()
+        if self.body_depth is not None and len(self.stack) < self.body_depth:
+            self.body_depth = None
+        self.handler.end(tag, len(self.stack))
+        return tag
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_charref(self, name):
+        # numeric references below 256 are windows-1252 characters, like in BeautifulSoup
+        try:
+            code_point = int(name[1:], 16) if name[:1] in "xX" else int(name)
+        except ValueError:
+            self.data.append(f"&#{name}")
+            return
+        data = None
+        if 0x80 <= code_point < 0xa0:
+            try:
+                data = bytes([code_point]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if data is None:
+            try:
+                data = chr(code_point)
+            except (ValueError, OverflowError):
+                data = "\N{REPLACEMENT CHARACTER}"
+        self.data.append(data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.data.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self.end_data()
+        self.data.append(data)
+        self.end_data(is_text=False)
+
+    def handle_decl(self, decl):
+        self.end_data()
+        self.data.append(decl[len("DOCTYPE "):])
+        self.end_data(is_text=False)
+
+    def unknown_decl(self, data):
+        self.end_data()
+        if data.upper().startswith("CDATA["):
+            self.data.append(data[len("CDATA["):])
+            self.end_data(cdata=True)
+        else:
+            self.data.append(data)
+            self.end_data(is_text=False)
+
+    def handle_pi(self, data):
+        self.end_data()
+        self.data.append(data)
+        self.end_data(is_text=False)
+
+    def end_data(self, is_text=True, cdata=False):
+        """
+        Send the data collected since the last element as a single string.
+        """
+        if not self.data:
+            return
+        text = "".join(self.data)
+        self.data = []
+        # whitespace only strings become a single new line or space
+        if not self.preserve_whitespace and not text.strip(ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        container_depth = None
+        if is_text and not cdata and self.container_depths:
+            is_text = False
+            container_depth = self.container_depths[-1]
+        self.handler.string(text, is_text, len(self.stack), self.body_depth is not None, container_depth)
+
+    def finish(self):
+        self.close()
+        self.end_data()
+        while self.stack:
+            self.pop()
+
+
+class TableOfContentsScan:
+    """
+    First pass: index the anchors of the document and find its table of contents,
+    like DocumentIndex and mongodb.identify_table_of_contents.
+    Only the rows of the open tables and of the best table found so far are kept.
+    """
+
+    def __init__(self, list_items):
+        self.any_item, self.item_patterns = mongodb.table_of_contents_patterns(list_items)
+        self.by_id = {}
+        self.by_name = {}
+        # open tables in body: [ordinal, depth, items found, rows]
+        self.tables = []
+        # open rows of the open tables: (row, depth of its children), a row is [hrefs or None, children],
+        # a child is [depth if it is a <script>, <style>... element else None, strings]
+        self.rows = []
+        self.best_rows = None
+        self.best_count = 0
+        self.best_ordinal = None
+
+    def find_anchor(self, href):
+        ordinal = self.by_id.get(href)
+        if ordinal is None:
+            ordinal = self.by_name.get(href)
+        return ordinal
+
+    def position(self, ordinal):
+        return ordinal
+
+    def start(self, name, attrs, ordinal, depth, in_body):
+        el_id = attrs.get("id")
+        if el_id is not None:
+            self.by_id.setdefault(el_id, ordinal)
+        el_name = attrs.get("name")
+        if el_name is not None:
+            self.by_name.setdefault(el_name, ordinal)
+        if not in_body:
+            return
+
+        for row, children_depth in self.rows:
+            if children_depth == depth:
+                row[1].append([depth if name in STRING_CONTAINER_ELEMENTS else None, []])
+            if name == "a" and row[0] is not None:
+                if "href" in attrs:
+                    row[0].append(attrs["href"][1:])
+                else:
+                    # tr.find_all("a") fails and the row is skipped
+                    row[0] = None
+
+        if name == "table":
+            self.tables.append([ordinal, depth, set(), []])
+        elif name == "tr" and self.tables:
+            row = [[], []]
+            for table in self.tables:
+                table[3].append(row)
+            self.rows.append((row, depth + 1))
+
+    def end(self, name, depth):
+        if name == "tr" and self.rows and self.rows[-1][1] == depth + 1:
+            self.rows.pop()
+        elif name == "table" and self.tables and self.tables[-1][1] == depth:
+            ordinal, _, found, rows = self.tables.pop()
+            # the first table in document order with the maximum number of items
+            count = len(found)
+            if count > self.best_count or (count > 0 and count == self.best_count and ordinal < self.best_ordinal):
+                self.best_rows = rows
+                self.best_count = count
+                self.best_ordinal = ordinal
+
+    def string(self, text, is_text, depth, in_body, container_depth):
+        if self.tables and self.any_item.search(text):
+            found = set(i for i, pattern in enumerate(self.item_patterns) if pattern.search(text))
+            for table in self.tables:
+                table[2] |= found
+
+        for row, children_depth in self.rows:
+            if children_depth == depth:
+                row[1].append([None, [text] if is_text else []])
+            else:
+                # .text of a child: its strings, or only the strings of a <script>, <style>... child
+                child = row[1][-1]
+                if (is_text and child[0] is None) or (container_depth is not None and container_depth == child[0]):
+                    child[1].append(text)
+
+    def table_of_contents_rows(self):
+        """
+        :return: the rows of the table of contents in the format of mongodb.table_of_contents_rows,
+            None if there is no table of contents
+        """
+        if self.best_count <= 3:
+            return None
+        return [(hrefs, ["".join(parts) for _, parts in children]) for hrefs, children in self.best_rows]
+
+
+class HrefSectionsText:
+    """
+    Collect the text of the sections found with the hrefs of the table of contents,
+    like mongodb.iter_sections_text_with_hrefs.
+    """
+
+    def __init__(self, sections):
+        self.starts = [sections[i]["idx"] for i in range(1, len(sections) + 1)]
+        self.next_section = 0
+        self.current_section = None
+        self.fragments = []
+        self.last_was_new_line = False
+        self.completed = []
+
+    def start(self, name, attrs, ordinal, depth, in_body):
+        if in_body and self.next_section < len(self.starts) and ordinal == self.starts[self.next_section]:
+            self.close()
+            self.current_section = self.next_section
+            self.next_section += 1
+
+    def end(self, name, depth):
+        pass
+
+    def string(self, text, is_text, depth, in_body, container_depth):
+        if self.current_section is None or not in_body:
+            return
+        found_text = text if is_text else ""
+        if found_text == "\n":
+            if self.last_was_new_line:
+                return
+            self.last_was_new_line = True
+        else:
+            self.last_was_new_line = False
+        self.fragments.append(found_text)
+
+    def close(self):
+        if self.current_section is not None:
+            self.completed.append((self.current_section, mongodb.join_section_fragments(self.fragments)))
+            self.fragments = []
+            self.last_was_new_line = False
+
+
+class BodyText:
+    """
+    Rebuild the body text of mongodb.get_sections_using_strings a chunk at a time:
+    strings of the body joined with spaces, transliterated to ascii, new lines and consecutive spaces replaced
+    with a single space. Each chunk is passed to consumer.feed.
+    """
+
+    def __init__(self, consumer):
+        self.consumer = consumer
+        self.first = True
+        self.last_is_space = False
+
+    def start(self, name, attrs, ordinal, depth, in_body):
+        pass
+
+    def end(self, name, depth):
+        pass
+
+    def string(self, text, is_text, depth, in_body, container_depth):
+        if not (is_text and in_body):
+            return
+        if self.first:
+            self.first = False
+        else:
+            text = " " + text
+        text = MULTIPLE_SPACES.sub(" ", mongodb.transliterate(text).replace("\n", " "))
+        if self.last_is_space and text.startswith(" "):
+            text = text[1:]
+        if text:
+            self.last_is_space = text[-1] == " "
+            self.consumer.feed(text)
+
+
+class HeadingMatch:
+    """
+    A match of a section heading in the body text, with the methods of re.Match used by mongodb.select_best_match.
+    """
+
+    __slots__ = ("_start", "_end", "_group")
+
+    def __init__(self, start, end, group):
+        self._start = start
+        self._end = end
+        self._group = group
+
+    def start(self):
+        return self._start
+
+    def end(self):
+        return self._end
+
+    def group(self):
+        return self._group
+
+
+class HeadingScanner:
+    """
+    Find the matches of a set of heading patterns in the body text, with the same results of
+    mongodb.SectionHeadingMatcher, keeping only a window of text around the occurrences of "item".
+    """
+
+    def __init__(self, keys):
+        self.patterns = []
+        for item, title in keys:
+            pattern, offset = mongodb.section_heading_pattern(item, title)
+            if offset < 0:
+                raise ValueError(f"section item {item} does not contain 'item'")
+            # the body text has no consecutive spaces: ". *" matches at most 2 characters
+            max_length = len(item) + (0 if title is None else 2 + len(title))
+            self.patterns.append(((item, title), pattern, offset, max_length))
+        self.max_before = max((offset for _, _, offset, _ in self.patterns), default=0)
+        self.max_after = max((max_length - offset for _, _, offset, max_length in self.patterns), default=0)
+        self.matches = {key: [] for key, _, _, _ in self.patterns}
+        self.last_end = {key: 0 for key, _, _, _ in self.patterns}
+        self.text = ""
+        self.text_start = 0
+        self.scanned = 0
+        self.pending = []
+
+    def feed(self, chunk):
+        self.text += chunk
+        text_end = self.text_start + len(self.text)
+        # "item" can't be split between two chunks, the strings are separated by spaces
+        for m in ITEM.finditer(self.text, max(self.scanned - self.text_start, 0)):
+            self.pending.append(self.text_start + m.start())
+        self.scanned = text_end
+
+        i = 0
+        while i < len(self.pending) and self.pending[i] + self.max_after <= text_end:
+            self.match_at(self.pending[i])
+            i += 1
+        del self.pending[:i]
+
+        keep_from = (self.pending[0] if self.pending else text_end) - self.max_before
+        if keep_from > self.text_start:
+            self.text = self.text[keep_from - self.text_start:]
+            self.text_start = keep_from
+
+    def close(self):
+        for position in self.pending:
+            self.match_at(position)
+        self.pending = []
+
+    def match_at(self, position):
+        for key, pattern, offset, _ in self.patterns:
+            # re.match with a negative position starts from 0
+            start = max(position - offset, 0)
+            # matches don't overlap, like re.finditer
+            if start < self.last_end[key]:
+                continue
+            m = pattern.match(self.text, start - self.text_start)
+            if m is not None:
+                end = self.text_start + m.end()
+                self.matches[key].append(HeadingMatch(start, end, m.group()))
+                self.last_end[key] = end
+
+
+class StreamHeadingMatcher:
+    """
+    SectionHeadingMatcher of a document read with a StreamSectionizer.
+    The headings of the expected sections are all found with a single pass over the document, a heading that
+    was not expected (e.g. a title changed by a previous match) needs another pass.
+    """
+
+    def __init__(self, sectionizer, keys):
+        self.sectionizer = sectionizer
+        self.matches = {}
+        self.scan(keys)
+
+    def scan(self, keys):
+        scanner = HeadingScanner(keys)
+        self.sectionizer.run(BodyText(scanner))
+        scanner.close()
+        self.matches.update(scanner.matches)
+
+    def finditer(self, item, title=None):
+        key = (item, title)
+        if key not in self.matches:
+            self.scan([key])
+        # select_best_match modifies the list
+        return list(self.matches[key])
+
+
+class StringSectionsText:
+    """
+    Split the body text at the start of each section, like the end of mongodb.get_sections_using_strings.
+    """
+
+    def __init__(self, located_sections):
+        self.starts = [s["start_index"] for _, s in located_sections]
+        self.current_section = -1
+        self.parts = []
+        self.offset = 0
+        self.completed = []
+
+    def feed(self, chunk):
+        chunk_end = self.offset + len(chunk)
+        position = self.offset
+        while self.current_section + 1 < len(self.starts) and self.starts[self.current_section + 1] < chunk_end:
+            next_start = max(self.starts[self.current_section + 1], position)
+            if self.current_section >= 0:
+                self.parts.append(chunk[position - self.offset:next_start - self.offset])
+                self.completed.append((self.current_section, "".join(self.parts)))
+            self.parts = []
+            self.current_section += 1
+            position = next_start
+        if self.current_section >= 0:
+            self.parts.append(chunk[position - self.offset:])
+        self.offset = chunk_end
+
+    def close(self):
+        # the last section ends one character before the end of the text
+        if self.current_section >= 0:
+            self.completed.append((self.current_section, "".join(self.parts)[:-1]))
+            self.parts = []
+
+
+class StreamSectionizer:
+    """
+    Extract the sections of a filing without building its soup object.
+    """
+
+    def __init__(self, source, list_items, default_sections, chunk_size=CHUNK_SIZE):
+        """
+        :param source: html string, text file-like object, or function returning a new text file-like object
+            of the html (the html is read more than once: a non seekable file is read in memory)
+        :param list_items: strings used to find the table of contents, None if there is no table of contents
+        :param default_sections: sections to look for if the table of contents has none
+        :param chunk_size: number of characters of html read at a time
+        """
+        if not isinstance(source, str) and not callable(source) and not source.seekable():
+            source = source.read()
+        self.source = source
+        self.list_items = list_items
+        self.default_sections = default_sections
+        self.chunk_size = chunk_size
+        self.body_found = False
+
+    def chunks(self):
+        if isinstance(self.source, str):
+            for i in range(0, len(self.source), self.chunk_size):
+                yield self.source[i:i + self.chunk_size]
+            return
+        if callable(self.source):
+            with self.source() as stream:
+                yield from iter(lambda: stream.read(self.chunk_size), "")
+        else:
+            self.source.seek(0)
+            yield from iter(lambda: self.source.read(self.chunk_size), "")
+
+    def iter_run(self, handler, collector=None):
+        """
+        Read the html once, calling handler for each event.
+        :param handler: handler of the events, see EventParser
+        :param collector: optional object with the list of completed sections and a close method
+        :return: a generator of the sections completed by the collector, after each chunk of html
+        """
+        parser = EventParser(handler)
+        for chunk in self.chunks():
+            parser.feed(chunk)
+            if collector is not None and collector.completed:
+                yield from collector.completed
+                collector.completed.clear()
+        parser.finish()
+        self.body_found = parser.body_found
+        if collector is not None:
+            collector.close()
+            yield from collector.completed
+            collector.completed.clear()
+
+    def run(self, handler):
+        for _ in self.iter_run(handler):
+            pass
+        return handler
+
+    def iter_sections(self):
+        """
+        :return: a generator of (section title, {"text": section text, "link": None}), in document order.
+            Nothing is generated if the document has no body.
+        """
+        rows = None
+        if self.list_items is not None:
+            scan = self.run(TableOfContentsScan(self.list_items))
+            if not self.body_found:
+                return
+            rows = scan.table_of_contents_rows()
+            if rows is not None:
+                sections = mongodb.sections_from_hrefs(rows, scan)
+                if len(sections) > 0:
+                    collector = HrefSectionsText(sections)
+                    for i, text in self.iter_run(collector, collector):
+                        yield sections[i + 1]["title"], text_section(text)
+                    return
+
+        sections = mongodb.sections_from_strings(rows) if rows else {}
+        if len(sections) == 0:
+            sections = copy.deepcopy(self.default_sections)
+            start_index = 1
+        else:
+            start_index = 0
+
+        matcher = StreamHeadingMatcher(self, heading_keys(sections))
+        if not self.body_found:
+            return
+        located_sections = mongodb.locate_sections(sections, matcher, start_index)
+        collector = StringSectionsText(located_sections)
+        for i, text in self.iter_run(BodyText(collector), collector):
+            yield located_sections[i][1]["title"], text_section(text)
+
+
+def heading_keys(sections):
+    """
+    :param sections: sections with their 'item' and 'title', see mongodb.sections_from_strings
+    :return: list of (item, title) patterns mongodb.locate_sections looks for
+    """
+    keys = []
+    for s in sections.values():
+        if 'item' in s:
+            titles = s['title'] if isinstance(s['title'], list) else [s['title']]
+            keys += [(s['item'], t) for t in titles]
+            keys.append((s['item'], None))
+    return list(dict.fromkeys(keys))
+
+
+def text_section(text):
+    text = re.sub('\n', ' ', text)
+    text = re.sub(' +', ' ', text)
+    return {"text": text, "link": None}
+
+
+def extract_sections(source, list_items, default_sections, chunk_size=CHUNK_SIZE):
+    """
+    Streaming version of mongodb.extract_sections, see StreamSectionizer.
+    :param source: html string, text file-like object, or function returning a new text file-like object of the html
+    :param list_items: strings used to find the table of contents, None if there is no table of contents
+    :param default_sections: sections to look for if the table of contents has none
+    :param chunk_size: number of characters of html read at a time
+    :return: a dictionary {section title: {"text": section text, "link": link}}, None if the html has no body
+    """
+    sectionizer = StreamSectionizer(source, list_items, default_sections, chunk_size)
+    result = {}
+    for title, section in sectionizer.iter_sections():
+        result[title] = section
+    if not sectionizer.body_found:
+        print("return because soup.body None")
+        return
+    return result
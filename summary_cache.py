@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import mongodb as mongodb
+import llm_backend as llm_backend
+
+# Cache of the section summaries made by analyzer.summarize_section.
+# An entry is keyed by the hash of the normalized section text, the model, the chain type and SUMMARY_PROMPT_VERSION:
+# the same text summarized with the same settings is never sent again to OpenAI.
+# Bump SUMMARY_PROMPT_VERSION when the prompts, the chunking or the post-processing of the summaries change,
+# so that the summaries made before are not reused.
+# The summaries of a backend other than OpenAI (e.g. llm_backend.FakeBackend) have their own keys,
+# an offline run never serves its summaries to the real runs.
+SUMMARY_PROMPT_VERSION = "1"
+SUMMARY_BACKEND = llm_backend.OpenAIBackend.name
+SUMMARY_CACHE_COLLECTION = "summary_cache"
+# SummaryCache.put runs the eviction every EVICT_EVERY writes
+EVICT_EVERY = 1000
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    :param text: section text
+    :return: the text with runs of whitespace replaced by a single space, stripped
+    """
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def summary_key(text, model, chain_type, prompt_version=SUMMARY_PROMPT_VERSION, backend=SUMMARY_BACKEND):
+    """
+    :param text: section text
+    :param model: OpenAI model
+    :param chain_type: langchain summarize chain type
+    :param prompt_version: version of the prompts
+    :param backend: name of the llm_backend that made the summary
+    :return: sha256 hex digest identifying the summary
+    """
+    text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    settings = f"{text_hash}|{model}|{chain_type}|{prompt_version}"
+    # the keys of the OpenAI summaries are the ones made before the backends
+    if backend != SUMMARY_BACKEND:
+        settings += f"|{backend}"
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()
+
+
+def current_backend(backend=None):
+    """
+    :param backend: backend name, or None
+    :return: backend, or the name of llm_backend.get_llm_backend() if None
+    """
+    return backend if backend is not None else llm_backend.get_llm_backend().name
+
+
+class FileSummaryStore:
+    """
+    Summaries stored as json files in a local directory (<directory>/ab/abcdef....json).
+    The modification time of a file is the last time the summary was used.
+    """
+
+    def __init__(self, directory=".summary_cache"):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def load(self, key):
+        try:
+            with open(self._path(key), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store(self, key, entry):
+        # write in a temporary file and rename it, so concurrent processes never read a partial file
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def touch(self, key):
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, max_entries=None, max_age=None):
+        """
+        :return: number of summaries removed
+        """
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        files.append((os.stat(path).st_mtime, path))
+                    except FileNotFoundError:
+                        pass
+        files.sort(reverse=True)
+
+        remove = []
+        if max_age is not None:
+            cutoff = time.time() - max_age
+            while files and files[-1][0] < cutoff:
+                remove.append(files.pop())
+        if max_entries is not None and len(files) > max_entries:
+            remove += files[max_entries:]
+
+        removed = 0
+        for _, path in remove:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+class MongoSummaryStore:
+    """
+    Summaries stored in a MongoDB collection, one document per key with a "last_used_at" timestamp.
+    """
+
+    def __init__(self, collection_name=SUMMARY_CACHE_COLLECTION):
+        self.collection_name = collection_name
+
+    def _collection(self):
+        return mongodb.get_collection(self.collection_name)
+
+    def load(self, key):
+        return self._collection().find_one({"_id": key}, {"_id": 0})
+
+    def store(self, key, entry):
+        self._collection().replace_one({"_id": key}, dict(entry, _id=key, last_used_at=time.time()), upsert=True)
+
+    def touch(self, key):
+        self._collection().update_one({"_id": key}, {"$set": {"last_used_at": time.time()}})
+
+    def evict(self, max_entries=None, max_age=None):
+        """
+        :return: number of summaries removed
+        """
+        collection = self._collection()
+        removed = 0
+        if max_age is not None:
+            removed += collection.delete_many({"last_used_at": {"$lt": time.time() - max_age}}).deleted_count
+        if max_entries is not None:
+            excess = collection.estimated_document_count() - max_entries
+            if excess > 0:
+                cursor = collection.find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess)
+                removed += collection.delete_many({"_id": {"$in": [d["_id"] for d in cursor]}}).deleted_count
+        return removed
+
+
+class SummaryCache:
+    """
+    Cache in front of analyzer.summarize_section.
+        cache = SummaryCache(FileSummaryStore(".summary_cache"), max_entries=100000)
+        bullets, cost = analyzer.summarize_section(text, model, chain_type, cache=cache)
+    A summary found in the cache costs nothing. The summaries are kept per backend: by default the one of
+    llm_backend.get_llm_backend(), 'backend' is the name of the backend of the caller otherwise. Summaries not used for 'max_age' seconds, and the least recently
+    used ones above 'max_entries', are removed by evict(), called by put() every 'evict_every' writes.
+    Can be shared by multiple threads.
+    """
+
+    def __init__(self, store=None, max_entries=None, max_age=None, prompt_version=SUMMARY_PROMPT_VERSION,
+                 evict_every=EVICT_EVERY):
+        self.store = store if store is not None else MongoSummaryStore()
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.prompt_version = prompt_version
+        self.evict_every = evict_every
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.saved_tokens = 0
+        self.saved_cost = 0
+
+    def get(self, text, model, chain_type, backend=None):
+        """
+        :return: the cached entry {"bullets", "tokens", "cost", ...} or None
+        """
+        return self.get_any(text, [(model, chain_type)], backend)
+
+    def get_any(self, text, settings, backend=None):
+        """
+        :param settings: list of tuples (model, chain_type) that can have summarized the text, in order of preference
+        :param backend: name of the backend, default the one of llm_backend.get_llm_backend()
+        :return: the first cached entry found for one of the settings, or None
+        """
+        backend = current_backend(backend)
+        for model, chain_type in settings:
+            key = summary_key(text, model, chain_type, self.prompt_version, backend)
+            entry = self.store.load(key)
+            if entry is not None:
+                with self.lock:
+                    self.hits += 1
+                    self.saved_tokens += entry["tokens"]
+                    self.saved_cost += entry["cost"]
+                self.store.touch(key)
+                return entry
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, model, chain_type, bullets, tokens, cost, backend=None):
+        backend = current_backend(backend)
+        entry = {"bullets": bullets, "tokens": tokens, "cost": cost, "model": model, "chain_type": chain_type,
+                 "prompt_version": self.prompt_version, "backend": backend, "text_length": len(text),
+                 "created_at": time.time()}
+        self.store.store(summary_key(text, model, chain_type, self.prompt_version, backend), entry)
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % self.evict_every == 0
+        if evict:
+            self.evict()
+        return entry
+
+    def get_or_create(self, text, model, chain_type, create, backend=None):
+        """
+        :param create: function create() -> (bullets, tokens, cost), called only if the summary is not cached
+        :return: a tuple (bullets, cost), cost is 0 for a cached summary
+        """
+        backend = current_backend(backend)
+        entry = self.get(text, model, chain_type, backend)
+        if entry is not None:
+            return entry["bullets"], 0
+        bullets, tokens, cost = create()
+        self.put(text, model, chain_type, bullets, tokens, cost, backend)
+        return bullets, cost
+
+    def evict(self):
+        """
+        Remove the summaries not used for max_age seconds and the least recently used above max_entries.
+        :return: number of summaries removed
+        """
+        if self.max_entries is None and self.max_age is None:
+            return 0
+        removed = self.store.evict(self.max_entries, self.max_age)
+        with self.lock:
+            self.evicted += removed
+        return removed
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None, "evicted": self.evicted,
+                    "saved_tokens": self.saved_tokens, "saved_cost": round(self.saved_cost, 4)}
+
+
+_default_summary_cache = None
+
+
+def get_summary_cache():
+    """
+    :return: the cache used by analyzer.sections_summary when no cache is given, stored in MongoDB
+    """
+    global _default_summary_cache
+    if _default_summary_cache is None:
+        _default_summary_cache = SummaryCache(MongoSummaryStore())
+    return _default_summary_cache
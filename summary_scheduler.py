@@ -0,0 +1,368 @@
+import asyncio
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import analyzer as analyzer
+import llm_backend as llm_backend
+import llm_models as llm_models
+import mongodb as mongodb
+import summary_cache as summary_cache
+
+# Concurrent summarization of documents with requests per minute and tokens per minute budgets.
+#     reports = summary_scheduler.run_summaries(docs, requests_per_minute=3500, tokens_per_minute=90000)
+# Sections of a document, and documents, are summarized concurrently. Before each section the scheduler reserves
+# the estimated number of LLM calls and tokens of the chain, and waits if the budgets are exhausted;
+# rate limit errors are retried with exponential backoff.
+
+# OpenAI limits of gpt-3.5-turbo, override them with the limits of the account
+DEFAULT_REQUESTS_PER_MINUTE = 3500
+DEFAULT_TOKENS_PER_MINUTE = 90000
+
+
+def estimate_section_usage(section_text, model, chain_type):
+    """
+    Estimate the LLM usage of analyzer.create_summary for a section, see llm_models.estimate_usage.
+    :param section_text: text of the section
+    :param model: model name
+    :param chain_type: "map_reduce", "refine" or "stuff"
+    :return: a tuple (number of calls, number of tokens)
+    """
+    calls, prompt_tokens, completion_tokens = llm_models.estimate_usage(
+        llm_models.count_tokens(section_text, model), model, chain_type)
+    return calls, prompt_tokens + completion_tokens
+
+
+def is_rate_limit_error(e):
+    """
+    :param e: exception raised by the LLM
+    :return: True for openai.RateLimitError, FakeRateLimitError and HTTP 429 errors
+    """
+    return "RateLimit" in type(e).__name__ or getattr(e, "status_code", None) == 429
+
+
+def retry_after(e):
+    """
+    :param e: rate limit error
+    :return: seconds to wait suggested by the error (Retry-After header), or None
+    """
+    value = getattr(e, "retry_after", None)
+    response = getattr(e, "response", None)
+    if value is None and response is not None:
+        value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class MinuteBudget:
+    """
+    Requests and tokens budgets over a sliding window of 'period' seconds, like the limits of the OpenAI API:
+    the requests and tokens reserved in any window never exceed the budgets.
+    Reservations are scheduled in order, a reservation larger than a budget is allowed alone in its window.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, period=60):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.period = period
+        # (scheduled time, requests, tokens), in order of time
+        self.reservations = deque()
+        self.last = 0
+
+    def _earliest(self, start, amounts):
+        # earliest time from start when the window ending at that time has room for amounts
+        t = start
+        for i, limit in enumerate(self.limits):
+            used = 0
+            for scheduled in reversed(self.reservations):
+                if scheduled[0] <= t - self.period:
+                    break
+                used += scheduled[i + 1]
+            if used + amounts[i] > limit:
+                # wait until enough of the oldest reservations of the window have expired
+                for scheduled in self.reservations:
+                    if scheduled[0] <= t - self.period:
+                        continue
+                    used -= scheduled[i + 1]
+                    t = max(t, scheduled[0] + self.period)
+                    if used + amounts[i] <= limit:
+                        break
+        return t
+
+    def reserve(self, requests, tokens):
+        """
+        :return: seconds to wait before sending the requests
+        """
+        now = time.monotonic()
+        while self.reservations and self.reservations[0][0] <= now - self.period:
+            self.reservations.popleft()
+        t = max(now, self.last)
+        while True:
+            earliest = self._earliest(t, (requests, tokens))
+            if earliest == t:
+                break
+            t = earliest
+        self.reservations.append((t, requests, tokens))
+        self.last = t
+        return t - now
+
+    def charge(self, tokens):
+        """
+        Add tokens used above the reservation, counted from now.
+        """
+        now = max(time.monotonic(), self.last)
+        self.reservations.append((now, 0, tokens))
+        self.last = now
+
+
+class OpenAISummarizer:
+    """
+    Calls the summarize chains of an llm_backend.LLMBackend (blocking langchain chains, shared by the threads)
+    in a pool of threads.
+    """
+
+    def __init__(self, max_workers=16, verbose=False, backend=None):
+        """
+        :param backend: llm_backend.LLMBackend, default llm_backend.get_llm_backend()
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.verbose = verbose
+        self.backend = backend
+
+    @property
+    def name(self):
+        """
+        :return: name of the backend, see summary_cache.summary_key
+        """
+        return (self.backend or llm_backend.get_llm_backend()).name
+
+    async def __call__(self, section_text, model, chain_type):
+        """
+        :return: a tuple (summary text, total tokens, cost)
+        """
+        backend = self.backend or llm_backend.get_llm_backend()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, backend.summarize,
+                                          section_text, model, chain_type, self.verbose)
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"rate limit reached, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class FakeLLM:
+    """
+    Local stand-in for OpenAISummarizer, to test and benchmark the scheduler without calling OpenAI.
+    A call sleeps 'latency' seconds plus 'seconds_per_1k_tokens' per 1000 tokens, and answers with the first
+    sentences of the text (llm_backend.fake_summary); tokens and cost are the ones estimated by llm_models.estimate_usage.
+    Like the OpenAI API, calls above requests_per_minute or tokens_per_minute in the last 'period' seconds are
+    rejected with FakeRateLimitError.
+    """
+    name = llm_backend.FakeBackend.name
+
+    def __init__(self, latency=0.5, seconds_per_1k_tokens=0.05, requests_per_minute=None, tokens_per_minute=None,
+                 period=60, failure_rate=0, seed=0):
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.period = period
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.window = deque()
+        self.calls = 0
+        self.tokens = 0
+        self.rejected = 0
+
+    def _admit(self, calls, tokens):
+        now = time.monotonic()
+        while self.window and self.window[0][0] <= now - self.period:
+            self.window.popleft()
+        used_calls = sum(c for _, c, _ in self.window)
+        used_tokens = sum(t for _, _, t in self.window)
+        if (self.requests_per_minute is not None and used_calls + calls > self.requests_per_minute) or \
+                (self.tokens_per_minute is not None and used_tokens + tokens > self.tokens_per_minute) or \
+                (self.failure_rate and self.random.random() < self.failure_rate):
+            self.rejected += 1
+            wait = self.window[0][0] + self.period - now if self.window else 1
+            raise FakeRateLimitError(wait)
+        self.window.append((now, calls, tokens))
+
+    async def __call__(self, section_text, model, chain_type):
+        calls, prompt_tokens, completion_tokens = llm_models.estimate_usage(
+            llm_models.count_tokens(section_text, model), model, chain_type)
+        tokens = prompt_tokens + completion_tokens
+        self._admit(calls, tokens)
+        await asyncio.sleep(self.latency * calls + self.seconds_per_1k_tokens * tokens / 1000)
+        self.calls += calls
+        self.tokens += tokens
+        return llm_backend.fake_summary(section_text), tokens, llm_models.compute_cost(prompt_tokens, model, completion_tokens)
+
+
+class SummaryScheduler:
+    """
+    Summarize the sections of many documents concurrently, within requests and tokens per minute budgets.
+        scheduler = SummaryScheduler(requests_per_minute=3500, tokens_per_minute=90000)
+        reports = asyncio.run(scheduler.summarize_documents(docs))
+    'llm' is an async function llm(section_text, model, chain_type) -> (summary, tokens, cost), by default
+    OpenAISummarizer; use FakeLLM to run offline. Its 'name' attribute keeps its summaries apart in the cache,
+    see summary_cache.summary_key.
+    """
+
+    def __init__(self, llm=None, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_concurrency=16, max_retries=6,
+                 backoff_factor=1, max_backoff=60, cache=None, verbose=False):
+        self.llm = llm if llm is not None else OpenAISummarizer(max_workers=max_concurrency, verbose=verbose)
+        self.budget = MinuteBudget(requests_per_minute, tokens_per_minute)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        if cache is None:
+            cache = summary_cache.get_summary_cache()
+        self.cache = cache if cache is not False else None
+        self.retries = 0
+
+    @property
+    def llm_name(self):
+        # an llm without name is cached like the backend of llm_backend.get_llm_backend()
+        return getattr(self.llm, "name", None)
+
+    def backoff_delay(self, attempt, error):
+        """
+        :param attempt: retry attempt number, starting from 0
+        :param error: the rate limit error
+        :return: seconds to wait before retrying, the delay suggested by the error takes precedence
+        """
+        suggested = retry_after(error)
+        if suggested is not None:
+            return min(suggested, self.max_backoff)
+        # jitter, so that the tasks rejected together don't retry together
+        return min(self.backoff_factor * (2 ** attempt), self.max_backoff) * random.uniform(0.5, 1)
+
+    async def summarize_section(self, section_text, model, chain_type):
+        """
+        :return: a tuple (bullets, tokens, cost, cached)
+        """
+        # the cache store (MongoDB by default) is blocking, it is called in a thread like the other MongoDB calls
+        if self.cache is not None:
+            entry = await asyncio.to_thread(self.cache.get, section_text, model, chain_type, self.llm_name)
+            if entry is not None:
+                return entry["bullets"], 0, 0, True
+
+        calls, estimated_tokens = estimate_section_usage(section_text, model, chain_type)
+        attempt = 0
+        while True:
+            wait = self.budget.reserve(calls, estimated_tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                async with self.semaphore:
+                    summary, tokens, cost = await self.llm(section_text, model, chain_type)
+                break
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                print(f"rate limited on {model}, retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self.retries += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        # charge the tokens used above the estimate
+        if tokens > estimated_tokens:
+            self.budget.charge(tokens - estimated_tokens)
+
+        bullets = analyzer.summary_bullets(summary)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, section_text, model, chain_type, bullets, tokens, cost,
+                                    self.llm_name)
+        return bullets, tokens, cost, False
+
+    async def summarize_document(self, doc, store=True):
+        """
+        Summarize the sections of a document like analyzer.sections_summary, all sections at the same time.
+        :param doc: a parsed_document from MongoDB
+        :param store: upsert the summary in "items_summary"; with False MongoDB is not used at all
+        :return: a tuple (summary document, report), (None, None) if the form type is not supported.
+         The report contains the number of sections summarized and found in the cache, tokens, cost, wall time
+         and the errors. The summary is not stored if a section failed.
+        """
+        start_time = time.perf_counter()
+        new_doc = analyzer.restructure_document(doc)
+        if new_doc is None:
+            return None, None
+
+        if store:
+            result = await asyncio.to_thread(analyzer.summary_document_header, doc)
+        else:
+            result = {"_id": doc["_id"], "form_type": doc["form_type"], "filing_date": doc.get("filing_date")}
+
+        sections = [(title, section) for title, section in new_doc.items()
+                    if len(section["text"]) >= analyzer.MIN_SECTION_LENGTH]
+        outcomes = await asyncio.gather(
+            *(self.summarize_section(section["text"], *analyzer.select_summary_model(title, section["text"]))
+              for title, section in sections),
+            return_exceptions=True)
+
+        report = {"_id": doc["_id"], "sections": len(sections), "cached": 0, "tokens": 0, "cost": 0, "errors": []}
+        for (title, section), outcome in zip(sections, outcomes):
+            if isinstance(outcome, Exception):
+                report["errors"].append(f"{title}: {type(outcome).__name__}: {outcome}")
+                continue
+            bullets, tokens, cost, cached = outcome
+            result[title] = {"summary": bullets, "links": section.get("links")}
+            report["cached"] += cached
+            report["tokens"] += tokens
+            report["cost"] += cost
+
+        if store and not report["errors"]:
+            await asyncio.to_thread(mongodb.upsert_document, "items_summary", result)
+
+        report["cost"] = round(report["cost"], 4)
+        report["duration"] = round(time.perf_counter() - start_time, 2)
+        return result, report
+
+    async def summarize_documents(self, docs, max_concurrent_documents=8, store=True):
+        """
+        :param docs: parsed_documents from MongoDB
+        :param max_concurrent_documents: number of documents summarized at the same time
+        :param store: see summarize_document
+        :return: list of the reports of the documents, in the order of docs
+        """
+        documents_semaphore = asyncio.Semaphore(max_concurrent_documents)
+
+        async def summarize(doc):
+            async with documents_semaphore:
+                _, report = await self.summarize_document(doc, store)
+            if report is not None:
+                print(f"{report['_id']} sections: {report['sections']} cached: {report['cached']} "
+                      f"tokens: {report['tokens']} cost: {report['cost']}$ duration: {report['duration']}s"
+                      + (f" errors: {report['errors']}" if report["errors"] else ""))
+            return report
+
+        start_time = time.perf_counter()
+        reports = await asyncio.gather(*(summarize(doc) for doc in docs))
+        total_cost = round(sum(r["cost"] for r in reports if r is not None), 4)
+        print(f"\nTotal Cost: {total_cost}$, Total duration: {round(time.perf_counter() - start_time, 1)}s, "
+              f"retries: {self.retries}")
+        if self.cache is not None:
+            print(f"Summary cache: {self.cache.stats()}")
+        return reports
+
+
+def run_summaries(docs, max_concurrent_documents=8, store=True, **scheduler_options):
+    """
+    Summarize documents with a SummaryScheduler, from synchronous code.
+    :param docs: parsed_documents from MongoDB
+    :param scheduler_options: SummaryScheduler parameters
+    :return: list of the reports of the documents
+    """
+    async def run():
+        scheduler = SummaryScheduler(**scheduler_options)
+        return await scheduler.summarize_documents(docs, max_concurrent_documents, store)
+
+    return asyncio.run(run())
@@ -0,0 +1,60 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+# the fixture filings are loaded like the corpus of the benchmarks
+from parser_backends import corpus_documents, load_corpus
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FIXTURE_FILINGS = os.path.join(FIXTURES, "filings")
+
+
+def fixture_filings():
+    """
+    :return: list of pytest params (name, form type, html) of the filings of tests/fixtures/filings,
+     the form type is the prefix of the file name
+    """
+    return [pytest.param(name, form_type, html, id=name)
+            for name, form_type, html in load_corpus(FIXTURE_FILINGS, None)]
+
+
+def fixture_documents(form_type="10-K"):
+    """
+    :return: parsed_documents like entries of the fixture filings of form_type
+    """
+    return corpus_documents([filing for filing in load_corpus(FIXTURE_FILINGS, None) if filing[1] == form_type])
+
+
+class WordEncoding:
+    """
+    tiktoken like encoding with one token per word, tiktoken downloads its encodings on first use
+    """
+    name = "cl100k_base"
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture
+def offline_encoding(monkeypatch):
+    import llm_models as llm_models
+
+    monkeypatch.setattr(llm_models, "get_encoding", lambda model: WordEncoding())
+    llm_models.count_tokens.cache_clear()
+    yield
+    llm_models.count_tokens.cache_clear()
+
+
+@pytest.fixture
+def fake_backend(offline_encoding, monkeypatch):
+    """
+    :return: llm_backend.FakeBackend without latency, used by analyzer during the test
+    """
+    import llm_backend as llm_backend
+
+    backend = llm_backend.FakeBackend(latency=0, seconds_per_1k_tokens=0, connect_latency=0)
+    monkeypatch.setattr(llm_backend, "_backend", backend)
+    return backend
@@ -0,0 +1,76 @@
+import json
+import zipfile
+from types import SimpleNamespace
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+import archive_loader as archive_loader
+import mongodb as mongodb
+
+
+def submissions(accessions, dates):
+    return {"cik": "1", "name": "Company", "filings": {"recent": {
+        "accessionNumber": accessions, "filingDate": dates, "form": ["10-K"] * len(accessions)}}}
+
+
+def history_page(accessions, dates):
+    return {"accessionNumber": accessions, "filingDate": dates, "form": ["10-K"] * len(accessions)}
+
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.documents = {}
+
+    def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise AutoReconnect("connection closed")
+        for operation in operations:
+            self.documents[operation._doc["_id"]] = operation._doc
+        return SimpleNamespace(inserted_count=0, upserted_count=len(operations), modified_count=0)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "submissions.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        for cik in range(1, 6):
+            zf.writestr(f"CIK{cik:010d}.json", json.dumps(submissions([f"a{cik}-2"], ["2024-02-01"])))
+        zf.writestr("CIK0000000001-submissions-001.json", json.dumps(history_page(["a1-1"], ["2020-02-01"])))
+        zf.writestr("README.txt", "not a member")
+    return path
+
+
+def test_load_submissions_archive(archive, monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(mongodb, "get_collection", lambda name: collection)
+    assert archive_loader.load_submissions_archive(archive, batch_size=2, workers=2) == 5
+    assert sorted(collection.documents) == [f"{cik:010d}" for cik in range(1, 6)]
+    history = collection.documents["0000000001"]["filings"]["history"]
+    assert history["accessionNumber"] == ["a1-1"]
+
+
+def test_load_archive_reports_failed_writes(archive, monkeypatch, capsys):
+    monkeypatch.setattr(mongodb, "get_collection", lambda name: FakeCollection(fail=True))
+    archive_loader.load_submissions_archive(archive, ciks=[1, 2, 3], batch_size=2, workers=2)
+    out = capsys.readouterr().out
+    # one failed flush of 2 documents from an upsert, the last one from close
+    assert out.count("AutoReconnect") == 2
+    assert "0 written, 3 errors, 0 failed upserts" in out
+
+
+def test_bulk_writer_counts_each_failed_document(monkeypatch, capsys):
+    class PartialCollection:
+        def bulk_write(self, operations, ordered=True):
+            raise BulkWriteError({"nInserted": 0, "nUpserted": 2, "nModified": 1, "writeErrors": [
+                {"index": 1, "code": 11000, "errmsg": "duplicate key"},
+                {"index": 3, "code": 2, "errmsg": "bad value"},
+                {"index": 4, "code": 2, "errmsg": "bad value"}]})
+
+    monkeypatch.setattr(mongodb, "get_collection", lambda name: PartialCollection())
+    with mongodb.BulkWriter("submissions", flush_size=5) as writer:
+        for cik in range(6):
+            writer.upsert({"_id": cik})
+    # two batches: 5 documents from the flush size, 1 from close
+    assert writer.written == 6
+    assert writer.errors == 4
+    assert capsys.readouterr().out.count("bad value") == 4
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+import pytest
+from pymongo import UpdateOne
+import analyzer as analyzer
+import batch_parse as batch_parse
+import mongodb as mongodb
+
+UNKNOWN_CIK = "0000000001"
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = {}
+
+    def find_one(self, query):
+        document_id = query["_id"]
+        if document_id == "missing":
+            return None
+        return {"_id": document_id, "cik": UNKNOWN_CIK if document_id == "new company" else "0000320193"}
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            if isinstance(operation, UpdateOne):
+                self.documents.setdefault(operation._filter["_id"], {"_id": operation._filter["_id"]}).update(
+                    operation._doc["$set"])
+            else:
+                self.documents[operation._doc["_id"]] = operation._doc
+        return SimpleNamespace(inserted_count=0, upserted_count=len(operations), modified_count=0)
+
+
+class InlinePool:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def imap_unordered(self, function, tasks):
+        return map(function, tasks)
+
+
+def parse_document_sections(doc, parser_backend=None):
+    if doc["_id"] == "broken":
+        raise ValueError("no body")
+    if doc["_id"] in ("unsupported", "new company"):
+        return None
+    return {"_id": doc["_id"], "cik": doc["cik"], "form_type": "10-K", "filing_date": None,
+            "sections": {"Item 1. Business": {"text": "text"}}, "parser_version": mongodb.PARSER_VERSION}
+
+
+@pytest.fixture
+def parsed_documents(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(mongodb, "get_collection", lambda name: collection)
+    monkeypatch.setattr(mongodb, "parse_document_sections", parse_document_sections)
+    monkeypatch.setattr(mongodb, "company_from_cik", lambda cik: None if cik == UNKNOWN_CIK else {"cik": cik})
+    monkeypatch.setattr(batch_parse.multiprocessing, "Pool", InlinePool)
+    return collection.documents
+
+
+def test_skipped_and_failed_documents_are_recorded(parsed_documents):
+    stats = batch_parse.parse_documents(["ok", "unsupported", "broken", "missing", "new company"], processes=1)
+    assert (stats["parsed"], stats["skipped"], stats["unknown_cik"], stats["failed"]) == (1, 1, 1, 2)
+    assert "sections" in parsed_documents["ok"] and "status" not in parsed_documents["ok"]
+    assert parsed_documents["unsupported"] == {"_id": "unsupported", "status": "skipped", "error": None,
+                                               "status_parser_version": mongodb.PARSER_VERSION}
+    assert parsed_documents["broken"]["status"] == "failed"
+    assert "ValueError: no body" in parsed_documents["broken"]["error"]
+    assert parsed_documents["missing"]["error"] == "document not found"
+    # selected again once the company is in the cik_ticker map
+    assert "new company" not in parsed_documents
+    # never parsed, not summarized
+    assert analyzer.restructure_document(parsed_documents["broken"]) is None
+
+
+def test_failure_keeps_the_sections_of_the_previous_parser_version(parsed_documents):
+    previous = {"_id": "broken", "cik": "0000320193", "form_type": "10-K", "filing_date": None,
+                "sections": {"Item 1. Business": {"text": "text"}}, "parser_version": mongodb.PARSER_VERSION - 1}
+    parsed_documents["broken"] = dict(previous)
+    batch_parse.parse_documents(["broken"], processes=1)
+    assert parsed_documents["broken"]["sections"] == previous["sections"]
+    assert parsed_documents["broken"]["parser_version"] == previous["parser_version"]
+    assert parsed_documents["broken"]["status"] == "failed"
+    assert parsed_documents["broken"]["status_parser_version"] == mongodb.PARSER_VERSION
@@ -0,0 +1,35 @@
+import analyzer as analyzer
+import boilerplate as boilerplate
+
+SAFE_HARBOR = ("This report contains forward-looking statements within the meaning of the Private Securities "
+               "Litigation Reform Act of 1995, which involve risks and uncertainties that could cause actual results "
+               "to differ materially from those expressed or implied by such statements, and we undertake no "
+               "obligation to update them except as required by law.")
+OWN = ("Our stores in the northern region were renovated during the year, and the new layout increased the traffic "
+       "of the stores and the sales of fresh products compared with the stores that were not renovated yet.")
+
+
+def boilerplate_index():
+    index = boilerplate.BoilerplateIndex(boilerplate.MemoryBoilerplateStore(), min_companies=2)
+    for cik in ("1", "2"):
+        index.add_signatures(cik, boilerplate.paragraph_signatures(SAFE_HARBOR))
+    return index
+
+
+def test_strip_boilerplate():
+    index = boilerplate_index()
+    text, removed = index.strip_boilerplate(OWN + "\n" + SAFE_HARBOR)
+    assert text == OWN
+    assert removed == [SAFE_HARBOR]
+
+
+def test_boilerplate_of_previous_filing_is_not_a_change(fake_backend):
+    index = boilerplate_index()
+    previous_sections = {"business": {"text": OWN + "\n" + SAFE_HARBOR}}
+    previous_summary = {"_id": "previous", "business": {"summary": ["stores renovated"]}}
+    text, _ = index.strip_boilerplate(OWN + "\n" + SAFE_HARBOR)
+
+    updated = analyzer.incremental_section_summary("business", text, (previous_sections, previous_summary),
+                                                   cache=None, boilerplate=index)
+    assert updated == (["stores renovated"], [], 0)
+    assert fake_backend.stats()["calls"] == 0
@@ -0,0 +1,23 @@
+import pandas as pd
+import mongodb as mongodb
+
+CIK_TICKER = {"_id": "cik_ticker", "updated_at": 1, "fields": ["cik", "name", "ticker", "exchange"],
+              "data": [[320193, "Apple Inc.", "AAPL", "Nasdaq"], [789019, "MICROSOFT CORP", "MSFT", "Nasdaq"],
+                       [320193, "Apple Inc.", "AAPL.OLD", None]]}
+
+
+class FakeCollection:
+    def find_one(self, query, projection=None):
+        return CIK_TICKER
+
+
+def test_company_from_cik(monkeypatch):
+    monkeypatch.setattr(mongodb, "get_collection", lambda name: FakeCollection())
+    monkeypatch.setattr(mongodb, "cik_ticker_resolver", mongodb.CikTickerResolver())
+
+    company = mongodb.company_from_cik("0000320193")
+    assert isinstance(company, pd.Series)
+    assert company["name"] == "Apple Inc." and company["ticker"] == "AAPL" and company["cik"] == "0000320193"
+    assert mongodb.company_from_cik("0000000001") is None
+    assert mongodb.cik_from_ticker("MSFT") == "0000789019"
+    assert mongodb.cik_from_ticker("XXXX") == -1
@@ -0,0 +1,30 @@
+import pytest
+import mongodb as mongodb
+from conftest import fixture_filings
+
+LIST_ITEMS = {"10-K": mongodb.list_10k_items, "10-Q": mongodb.list_10q_items, "8-K": None}
+
+
+@pytest.mark.parametrize("name,form_type,html", fixture_filings())
+def test_index_matches_soup_lookups(name, form_type, html):
+    soup = mongodb.make_soup(html)
+    index = mongodb.DocumentIndex(soup)
+    assert index.body_tables() == soup.body.find_all("table")
+    table_of_contents = mongodb.identify_table_of_contents(soup, LIST_ITEMS[form_type], index)
+    assert table_of_contents is mongodb.identify_table_of_contents(soup, LIST_ITEMS[form_type])
+    for el in soup.find_all(id=True):
+        assert index.find_anchor(el["id"]) is soup.find(id=el["id"])
+
+
+@pytest.mark.parametrize("name,form_type,html", fixture_filings())
+def test_extract_sections_builds_one_index(name, form_type, html, monkeypatch):
+    builds = []
+    build = mongodb.DocumentIndex._build
+
+    def counted_build(index):
+        builds.append(index)
+        build(index)
+
+    monkeypatch.setattr(mongodb.DocumentIndex, "_build", counted_build)
+    assert mongodb.extract_sections(html, form_type)
+    assert len(builds) <= 1
@@ -0,0 +1,76 @@
+import pytest
+from gridfs.errors import NoFile
+from pymongo.errors import AutoReconnect, DuplicateKeyError
+import filing_store as filing_store
+import mongodb as mongodb
+
+URL = "https://www.sec.gov/Archives/edgar/data/320193/000032019323000106/aapl-20230930.htm"
+
+
+class FakeBucket:
+    files = {}
+
+    def __init__(self, db, bucket_name):
+        pass
+
+    def upload_from_stream_with_id(self, file_id, filename, source, metadata=None):
+        self.files[file_id] = source.read()
+
+    def delete(self, file_id):
+        if file_id not in self.files:
+            raise NoFile(file_id)
+        del self.files[file_id]
+
+
+class FakeCollection:
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.documents = {}
+
+    def insert_one(self, doc):
+        if self.fail is not None:
+            raise self.fail
+        self.documents[doc["_id"]] = doc
+
+    def count_documents(self, query, limit=0):
+        return sum(1 for d in self.documents.values() if all(d.get(k) == v for k, v in query.items()))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    FakeBucket.files = {}
+    monkeypatch.setattr(filing_store, "GridFSBucket", FakeBucket)
+    # every filing goes to GridFS
+    monkeypatch.setattr(filing_store, "INLINE_MAX_BYTES", 10)
+    collection = FakeCollection()
+    db = {"documents": collection}
+    monkeypatch.setattr(mongodb, "get_mongodb_client", lambda: {mongodb.DB_NAME: db})
+    monkeypatch.setattr(mongodb, "get_collection", lambda name: collection)
+    return db
+
+
+def test_store_document_in_gridfs(db):
+    mongodb.store_document(URL, "0000320193", "10-K", "2023-11-03", "<html>10-K</html>")
+    assert db["documents"].documents[URL]["gridfs_id"] == URL
+    assert URL in FakeBucket.files
+
+
+def test_failed_insert_deletes_the_upload(db):
+    db["documents"].fail = AutoReconnect("connection closed")
+    with pytest.raises(AutoReconnect):
+        mongodb.store_document(URL, "0000320193", "10-K", "2023-11-03", "<html>10-K</html>")
+    assert FakeBucket.files == {}
+
+
+def test_upload_of_a_stored_document_is_kept(db):
+    mongodb.store_document(URL, "0000320193", "10-K", "2023-11-03", "<html>10-K</html>")
+    assert not filing_store.discard_upload(db, db["documents"].documents[URL])
+    assert URL in FakeBucket.files
+
+
+def test_duplicate_with_writer_is_ignored(db):
+    mongodb.store_document(URL, "0000320193", "10-K", "2023-11-03", "<html>10-K</html>")
+    db["documents"].fail = DuplicateKeyError("duplicate key")
+    mongodb.store_document(URL, "0000320193", "10-K", "2023-11-03", "<html>10-K</html>",
+                           writer=mongodb.BulkWriter("documents"))
+    assert URL in FakeBucket.files
@@ -0,0 +1,66 @@
+import os
+import threading
+import requests
+import edgar_client as edgar_client
+import http_cache as http_cache
+
+ARCHIVE_URL = "https://www.sec.gov/Archives/edgar/data/320193/{}.htm"
+
+
+def fetcher(calls):
+    def fetch(url, headers):
+        calls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = url.encode("utf-8") * 100
+        response.encoding = "utf-8"
+        return response
+    return fetch
+
+
+def test_cache_is_opt_in(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(edgar_client, "_client", None)
+    assert edgar_client.get_edgar_client().cache is None
+    edgar_client.configure_cache(str(tmp_path / "cache"), max_size=1000)
+    assert edgar_client.get_edgar_client().cache.max_size == 1000
+
+
+def test_evict_least_recently_used(tmp_path):
+    calls = []
+    urls = [ARCHIVE_URL.format(i) for i in range(6)]
+    # room for 5 bodies and a half
+    cache = http_cache.HttpCache(str(tmp_path), max_size=len(urls[0]) * 550)
+    for i, url in enumerate(urls[:5]):
+        cache.get(url, fetcher(calls))
+        # the bodies are ordered by their last use
+        os.utime(cache._object_path(cache.load(url)[0]["content_hash"]), (i, i))
+    assert cache.stats()["evicted"] == 0
+
+    # using the first url makes the second one the least recently used
+    cache.get(urls[0], fetcher(calls))
+    # the sixth body goes over max_size, the bodies are removed until 90% of it
+    cache.get(urls[5], fetcher(calls))
+    assert cache.stats()["evicted"] == 2
+    assert [cache.load(url) is not None for url in urls] == [True, False, False, True, True, True]
+    assert not os.path.exists(cache._url_path(urls[1]))
+    assert len(calls) == 6
+    sizes = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(tmp_path / "objects")
+                for f in files)
+    assert sizes == cache.size
+
+
+def test_counters_are_thread_safe(tmp_path):
+    cache = http_cache.HttpCache(str(tmp_path))
+    cache.get(ARCHIVE_URL.format(0), fetcher([]))
+
+    def hit():
+        for _ in range(200):
+            cache.get(ARCHIVE_URL.format(0), fetcher([]))
+
+    threads = [threading.Thread(target=hit) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert cache.stats() == {"hits": 1600, "misses": 1, "revalidated": 0, "evicted": 0}
@@ -0,0 +1,35 @@
+import incremental_summary as incremental_summary
+
+SENTENCES = [f"The company sells product number {i} to customers in the region of market {i}, and expects the "
+             f"demand for it to continue growing over the next fiscal year." for i in range(60)]
+
+
+def section(sentences):
+    # like the text stored by mongodb.extract_sections, without line breaks
+    return " ".join(sentences)
+
+
+def test_section_without_line_breaks_is_split_in_paragraphs():
+    paragraphs = incremental_summary.split_paragraphs(section(SENTENCES))
+    assert len(paragraphs) > 1
+    assert all(len(p) <= incremental_summary.MAX_PARAGRAPH_LENGTH for p in paragraphs)
+    assert " ".join(paragraphs) == section(SENTENCES)
+
+
+def test_added_sentence_is_added():
+    added = "A new cybersecurity incident disrupted the operations of the company during the quarter."
+    previous = incremental_summary.split_paragraphs(section(SENTENCES))
+    current = incremental_summary.split_paragraphs(section(SENTENCES[:30] + [added] + SENTENCES[30:]))
+    diff = incremental_summary.align_paragraphs(previous, current)
+    changed = diff["added"] + [c for _, c in diff["changed"]]
+    assert any(added in p for p in changed)
+    assert not diff["removed"]
+    assert len(diff["unchanged"]) >= len(previous) - 1
+
+
+def test_changed_figure_is_a_change():
+    previous = incremental_summary.split_paragraphs(section(SENTENCES))
+    current = incremental_summary.split_paragraphs(section(SENTENCES).replace("number 7 ", "number 8 "))
+    diff = incremental_summary.align_paragraphs(previous, current)
+    assert len(diff["changed"]) == 1
+    assert "number 8 " in diff["changed"][0][1]
@@ -0,0 +1,76 @@
+import socket
+import pytest
+import analyzer as analyzer
+import llm_backend as llm_backend
+import mongodb as mongodb
+from conftest import fixture_documents
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("network used by an offline run")
+
+    monkeypatch.setattr(socket.socket, "connect", refuse)
+    monkeypatch.setattr(mongodb, "get_collection", refuse)
+
+
+def summaries(results):
+    return {(doc_id, title): value["summary"] for doc_id, result in results.items()
+            for title, value in result.items() if isinstance(value, dict)}
+
+
+def documents_summary(docs, pack):
+    return analyzer.documents_summary(docs, cache=False, pack=pack, incremental=False, store=False)
+
+
+@pytest.mark.parametrize("form_type", ["10-K", "8-K"])
+def test_documents_summary_offline(form_type, fake_backend, no_network, monkeypatch):
+    docs = fixture_documents(form_type)
+    results, cost = documents_summary(docs, pack=False)
+    stats = fake_backend.stats()
+    sections = summaries(results)
+    assert sections and all(sections.values())
+    # one call per section, sharing a single client and chain
+    assert stats["calls"] == len(sections)
+    assert (stats["clients"], stats["chains"]) == (1, 1)
+    assert cost == pytest.approx(stats["cost"])
+
+    # a new client and chain for every call, same summaries
+    unpooled = llm_backend.FakeBackend(latency=0, seconds_per_1k_tokens=0, connect_latency=0, pooled=False)
+    monkeypatch.setattr(llm_backend, "_backend", unpooled)
+    unpooled_results, unpooled_cost = documents_summary(docs, pack=False)
+    assert summaries(unpooled_results) == sections
+    assert unpooled.stats()["clients"] == unpooled.stats()["calls"] == len(sections)
+    assert unpooled_cost == pytest.approx(cost)
+
+    # the short sections of all the documents packed in a single call
+    packed = llm_backend.FakeBackend(latency=0, seconds_per_1k_tokens=0, connect_latency=0)
+    monkeypatch.setattr(llm_backend, "_backend", packed)
+    packed_results, packed_cost = documents_summary(docs, pack=True)
+    assert summaries(packed_results) == sections
+    assert packed.stats()["calls"] == 1
+    assert packed_cost == pytest.approx(packed.stats()["cost"])
+
+
+def test_sections_summary_offline(fake_backend, no_network):
+    doc = fixture_documents("10-Q")[0]
+    result, cost = analyzer.sections_summary(doc, cache=False, pack=False, incremental=False, store=False)
+    assert result["_id"] == doc["_id"]
+    assert fake_backend.stats()["calls"] == len(summaries({doc["_id"]: result})) > 0
+    assert cost == pytest.approx(fake_backend.stats()["cost"])
+
+
+def test_incomplete_backend_fails_on_construction():
+    class SummaryOnlyBackend(llm_backend.LLMBackend):
+        def create_client(self, model, verbose):
+            return model
+
+        def create_chain(self, model, chain_type, verbose):
+            return model, chain_type
+
+        def summarize(self, text, model, chain_type, verbose=False):
+            return text, 0, 0
+
+    with pytest.raises(TypeError):
+        SummaryOnlyBackend()
@@ -0,0 +1,23 @@
+import section_packing as section_packing
+
+PACK = [(("doc", "item1"), "item1", "text 1", 10), (("doc", "item2"), "item2", "text 2", 10),
+        (("doc", "item3"), "item3", "text 3", 10)]
+
+
+def test_parse_packed_response():
+    response = 'Here it is: {"1": "first summary", "2": ["second", "summary"], "3": " "}'
+    assert section_packing.parse_packed_response(response, PACK) == {
+        ("doc", "item1"): "first summary", ("doc", "item2"): "second summary"}
+
+
+def test_parse_truncated_response():
+    response = '{"1": "first \\"quoted\\" summary", "2": "second summ'
+    assert section_packing.parse_packed_response(response, PACK) == {
+        ("doc", "item1"): 'first "quoted" summary'}
+
+
+def test_parse_invalid_escape():
+    # \$ is not a json escape: the other members are kept, item2 is left to be summarized alone
+    response = '{"1": "first summary", "2": "revenue of \\$5 million", "3": "third\\nsummary"}'
+    assert section_packing.parse_packed_response(response, PACK) == {
+        ("doc", "item1"): "first summary", ("doc", "item3"): "third\nsummary"}
@@ -0,0 +1,10 @@
+import pytest
+from conftest import fixture_filings
+import mongodb as mongodb
+
+
+@pytest.mark.parametrize("name, form_type, html", fixture_filings())
+def test_stream_backend_matches_html_parser(name, form_type, html):
+    expected = mongodb.extract_sections(html, form_type, parser_backend="html.parser")
+    assert expected, f"no sections found in {name}"
+    assert mongodb.extract_sections(html, form_type, parser_backend="stream") == expected
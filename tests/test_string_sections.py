@@ -0,0 +1,32 @@
+import hashlib
+import json
+import os
+import pytest
+import mongodb as mongodb
+from conftest import FIXTURES, fixture_filings
+
+FORMS = {
+    "10-K": (mongodb.list_10k_items, mongodb.default_10k_sections),
+    "10-Q": (mongodb.list_10q_items, mongodb.default_10q_sections),
+    "8-K": (None, mongodb.default_8k_sections),
+}
+
+# sections found by the implementation of get_sections_using_strings before the batch scoring of the candidates,
+# (title, start_index, end_index, sha1 of the text) with the table of contents of the filing and with default_sections
+with open(os.path.join(FIXTURES, "string_sections.json"), "r", encoding="utf-8") as fp:
+    EXPECTED = json.load(fp)
+
+
+def summary(sections):
+    return [[s["title"], s["start_index"], s["end_index"], hashlib.sha1(s["text"].encode()).hexdigest()]
+            for s in sections.values()]
+
+
+@pytest.mark.parametrize("name,form_type,html", fixture_filings())
+def test_get_sections_using_strings(name, form_type, html):
+    list_items, default_sections = FORMS[form_type]
+    soup = mongodb.make_soup(html)
+    table_of_contents = mongodb.identify_table_of_contents(soup, list_items)
+    assert summary(mongodb.get_sections_using_strings(soup, table_of_contents, default_sections)) \
+        == EXPECTED[name]["toc"]
+    assert summary(mongodb.get_sections_using_strings(soup, None, default_sections)) == EXPECTED[name]["default"]
@@ -0,0 +1,55 @@
+import os
+import summary_cache as summary_cache
+
+
+def test_put_evicts_every_n_writes(tmp_path):
+    store = summary_cache.FileSummaryStore(str(tmp_path))
+    cache = summary_cache.SummaryCache(store, max_entries=3, evict_every=5)
+    for i in range(4):
+        cache.put(f"text {i}", "gpt-3.5-turbo", "stuff", [f"bullet {i}"], 10, 0.01)
+        os.utime(store._path(summary_cache.summary_key(f"text {i}", "gpt-3.5-turbo", "stuff")), (i, i))
+    assert cache.stats()["evicted"] == 0
+
+    # the fifth write runs the eviction, the 2 least recently used summaries are removed
+    cache.put("text 4", "gpt-3.5-turbo", "stuff", ["bullet 4"], 10, 0.01)
+    assert cache.stats()["evicted"] == 2
+    assert [cache.get(f"text {i}", "gpt-3.5-turbo", "stuff") is not None for i in range(5)] \
+        == [False, False, True, True, True]
+
+
+def test_put_without_limits_never_evicts(tmp_path):
+    cache = summary_cache.SummaryCache(summary_cache.FileSummaryStore(str(tmp_path)), evict_every=1)
+    for i in range(3):
+        cache.put(f"text {i}", "gpt-3.5-turbo", "stuff", [f"bullet {i}"], 10, 0.01)
+    assert cache.stats()["evicted"] == 0
+    assert all(cache.get(f"text {i}", "gpt-3.5-turbo", "stuff") is not None for i in range(3))
+
+
+def test_fake_summaries_are_not_served_to_openai(tmp_path, fake_backend, monkeypatch):
+    import analyzer as analyzer
+    import llm_backend as llm_backend
+    from conftest import fixture_documents
+
+    cache = summary_cache.SummaryCache(summary_cache.FileSummaryStore(str(tmp_path)))
+    docs = fixture_documents("8-K")
+    analyzer.documents_summary(docs, cache=cache, pack=False, incremental=False, store=False)
+    assert cache.stats()["misses"] > 0 and cache.stats()["hits"] == 0
+
+    # the same run with FakeBackend is served from the cache
+    analyzer.documents_summary(docs, cache=cache, pack=False, incremental=False, store=False)
+    assert cache.stats()["hits"] == cache.stats()["misses"]
+
+    # the real backend does not find them
+    text = "section text " * 30
+    cache.put(text, "gpt-3.5-turbo", "stuff", ["fake"], 10, 0.01)
+    assert cache.get(text, "gpt-3.5-turbo", "stuff")["backend"] == "fake"
+    monkeypatch.setattr(llm_backend, "_backend", llm_backend.OpenAIBackend(api_key="unused"))
+    assert cache.get(text, "gpt-3.5-turbo", "stuff") is None
+    assert cache.get(text, "gpt-3.5-turbo", "stuff", backend="fake") is not None
+
+
+def test_openai_keys_unchanged():
+    # the summaries cached before the backends are still found
+    assert summary_cache.summary_key("text", "gpt-3.5-turbo", "stuff") == \
+        summary_cache.hashlib.sha256(
+            f"{summary_cache.hashlib.sha256(b'text').hexdigest()}|gpt-3.5-turbo|stuff|1".encode()).hexdigest()
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import summary_cache as summary_cache
+import summary_scheduler as summary_scheduler
+from conftest import fixture_documents
+
+
+class SlowStore(summary_cache.FileSummaryStore):
+    """
+    Blocking store, like MongoSummaryStore with a slow connection
+    """
+
+    def load(self, key):
+        time.sleep(0.1)
+        return super().load(key)
+
+
+def summarize(scheduler, docs):
+    async def run():
+        return await asyncio.gather(*(scheduler.summarize_document(doc, store=False) for doc in docs))
+
+    return asyncio.run(run())
+
+
+def test_documents_summarized_then_cached(offline_encoding, tmp_path):
+    docs = fixture_documents()
+    llm = summary_scheduler.FakeLLM(latency=0.01, seconds_per_1k_tokens=0)
+    cache = summary_cache.SummaryCache(summary_cache.FileSummaryStore(str(tmp_path)))
+
+    outcomes = summarize(summary_scheduler.SummaryScheduler(llm, cache=cache), docs)
+    for result, report in outcomes:
+        assert report["errors"] == []
+        assert report["sections"] > 0 and report["cached"] == 0 and report["cost"] > 0
+        assert all(result[title]["summary"] for title in result if isinstance(result[title], dict))
+    calls = llm.calls
+
+    outcomes = summarize(summary_scheduler.SummaryScheduler(llm, cache=cache), docs)
+    for _, report in outcomes:
+        assert report["cached"] == report["sections"] and report["cost"] == 0
+    assert llm.calls == calls
+
+
+def test_sections_summarized_concurrently(offline_encoding):
+    docs = fixture_documents()
+    llm = summary_scheduler.FakeLLM(latency=0.2, seconds_per_1k_tokens=0)
+    start = time.perf_counter()
+    outcomes = summarize(summary_scheduler.SummaryScheduler(llm, cache=False), docs)
+    sections = sum(report["sections"] for _, report in outcomes)
+    assert sections >= 5
+    assert time.perf_counter() - start < 0.2 * sections / 2
+
+
+def test_cache_store_does_not_block_the_event_loop(offline_encoding, tmp_path):
+    docs = fixture_documents()
+    llm = summary_scheduler.FakeLLM(latency=0, seconds_per_1k_tokens=0)
+    cache = summary_cache.SummaryCache(SlowStore(str(tmp_path)))
+    start = time.perf_counter()
+    outcomes = summarize(summary_scheduler.SummaryScheduler(llm, cache=cache), docs)
+    sections = sum(report["sections"] for _, report in outcomes)
+    assert time.perf_counter() - start < 0.1 * sections / 2
+
+
+def test_rate_limit_errors_are_retried(offline_encoding):
+    docs = fixture_documents()
+    llm = summary_scheduler.FakeLLM(latency=0, seconds_per_1k_tokens=0, failure_rate=0.3, seed=1)
+    # the delay suggested by FakeRateLimitError (1s when the window is empty) is capped by max_backoff
+    scheduler = summary_scheduler.SummaryScheduler(llm, cache=False, backoff_factor=0.01, max_backoff=0.01,
+                                                   max_retries=20)
+    outcomes = summarize(scheduler, docs)
+    assert llm.rejected > 0 and scheduler.retries == llm.rejected
+    assert all(report["errors"] == [] for _, report in outcomes)